@@ -0,0 +1,95 @@
+"""
+Cache-friendly static and upload serving
+
+Templates link static assets with static_url("style.css"), which returns
+a fingerprinted URL (/static/style.<hash>.css). Because the URL changes
+whenever the file does, browsers may cache it forever. Uploaded originals
+are content-addressed already (app.uploads), so their URLs never change
+either. Both are sent with "Cache-Control: immutable" and a strong
+content-based ETag. Anything else, including the WebP variants (which
+generate_image_variants.py may re-render under the same URL), is
+revalidated on every use. Range and
+If-Range requests are handled by Starlette's FileResponse.
+"""
+import hashlib
+import os
+import re
+from functools import lru_cache
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+STATIC_DIR = "static"
+FINGERPRINT_LENGTH = 12
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# name.<fingerprint>.ext as produced by static_url()
+FINGERPRINTED_NAME = re.compile(rf"^(?P<stem>.+)\.(?P<fingerprint>[0-9a-f]{{{FINGERPRINT_LENGTH}}})(?P<ext>\.[^.]+)$")
+# Content-addressed uploads: ab/<sha256>.<ext> with the extensions of app.uploads.
+# Variants (_<size>.webp, .webp) are not: they are re-rendered in place when settings change.
+CONTENT_ADDRESSED_UPLOAD = re.compile(r"^[0-9a-f]{2}/(?P<name>[0-9a-f]{64})\.(?:jpg|png)$")
+
+@lru_cache(maxsize=256)
+def _file_digest(path: str, mtime_ns: int, size: int) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def file_digest(path: str, stat_result: os.stat_result) -> str:
+    """SHA-256 of a file, recomputed only when it changes"""
+    return _file_digest(path, stat_result.st_mtime_ns, stat_result.st_size)
+
+def static_url(name: str) -> str:
+    """Fingerprinted URL of a file in static/ (template helper)"""
+    path = os.path.join(STATIC_DIR, name)
+    stem, ext = os.path.splitext(name)
+    fingerprint = file_digest(path, os.stat(path))[:FINGERPRINT_LENGTH]
+    return f"/static/{stem}.{fingerprint}{ext}"
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with per-file Cache-Control and ETag (see cache_headers)"""
+
+    def cache_headers(self, full_path: str, stat_result: os.stat_result, scope) -> dict:
+        return {"cache-control": REVALIDATE_CACHE_CONTROL}
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        # FileResponse keeps the ETag given here; Range/If-Range are handled by it
+        response = FileResponse(
+            full_path, status_code=status_code, stat_result=stat_result,
+            headers=self.cache_headers(str(full_path), stat_result, scope),
+        )
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+class FingerprintedStaticFiles(CachedStaticFiles):
+    """Serves name.<fingerprint>.ext as name.ext; immutable while the fingerprint is current"""
+
+    def get_path(self, scope) -> str:
+        path = super().get_path(scope)
+        match = FINGERPRINTED_NAME.match(os.path.basename(path))
+        if match:
+            return os.path.join(os.path.dirname(path), match["stem"] + match["ext"])
+        return path
+
+    def cache_headers(self, full_path, stat_result, scope) -> dict:
+        digest = file_digest(full_path, stat_result)
+        match = FINGERPRINTED_NAME.match(os.path.basename(super().get_path(scope)))
+        # A stale fingerprint (page rendered before a deploy) gets the current file, revalidated
+        immutable = match is not None and match["fingerprint"] == digest[:FINGERPRINT_LENGTH]
+        return {
+            "etag": f'"{digest}"',
+            "cache-control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+        }
+
+class UploadFiles(CachedStaticFiles):
+    """Uploaded images: content-addressed files are immutable, with their hash as ETag"""
+
+    def cache_headers(self, full_path, stat_result, scope) -> dict:
+        relative_path = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+        match = CONTENT_ADDRESSED_UPLOAD.match(relative_path)
+        if match is None:
+            # Variants and files stored before content addressing keep mtime-based validation
+            return {"cache-control": REVALIDATE_CACHE_CONTROL}
+        return {"etag": f'"{match["name"]}"', "cache-control": IMMUTABLE_CACHE_CONTROL}
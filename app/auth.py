@@ -1,12 +1,20 @@
+from collections import deque
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import logging
+import time
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import User
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import AsyncSessionLocal, get_db, get_read_db
+from app.models import User, UserChange, UserRole
+from app.changes import CHANGE_FEED_LAG_SECONDS, change_head
+from app.cache import TTLCache
 
 # Secret keys (use environment variables)
 import os
@@ -15,20 +23,41 @@ REFRESH_SECRET_KEY = os.getenv("REFRESH_SECRET_KEY", "your-refresh-secret-key-ch
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))  # 1 hour
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))  # 7 days
+EVENTS_TICKET_EXPIRE_SECONDS = int(os.getenv("EVENTS_TICKET_EXPIRE_SECONDS", "60"))  # 1 minute
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Authenticated-principal cache (per worker process)
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+
+# Token-version (epoch) cache used to reject tokens issued before a role change
+EPOCH_CACHE_TTL_SECONDS = float(os.getenv("EPOCH_CACHE_TTL_SECONDS", "30"))
+epoch_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=EPOCH_CACHE_TTL_SECONDS)
+# Writes on other workers evict cached entries within this interval (see _run_cache_invalidation)
+CACHE_INVALIDATION_SECONDS = float(os.getenv("CACHE_INVALIDATION_SECONDS", "1"))
+
+# Verified-token cache: decoded claims keyed by token digest, kept until "exp"
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))  # 0 disables the cache
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+logger = logging.getLogger(__name__)
+
+_invalidation_task: Optional[asyncio.Task] = None
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+@dataclass(frozen=True)
+class Principal:
+    """Authenticated caller as described by the access token claims"""
+    id: int
+    role: UserRole
+    token_version: int
 
-def get_password_hash(password: str) -> str:
-    """Hash a password"""
-    return pwd_context.hash(password)
+def user_token_claims(user: User) -> dict:
+    """Claims identifying a user in access and refresh tokens"""
+    # sub must be string for python-jose
+    return {"sub": str(user.id), "role": user.role.value, "ver": user.token_version}
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
@@ -49,29 +78,112 @@ def create_refresh_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, REFRESH_SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_events_ticket(principal: Principal) -> str:
+    """Create a short-lived JWT that only opens the user event stream"""
+    expire = datetime.utcnow() + timedelta(seconds=EVENTS_TICKET_EXPIRE_SECONDS)
+    to_encode = {
+        "sub": str(principal.id),
+        "role": principal.role.value,
+        "ver": principal.token_version,
+        "exp": expire,
+        "type": "events",
+    }
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
 def verify_token(token: str, is_refresh: bool = False) -> dict:
     """Verify and decode JWT token"""
+    cache_key = (hashlib.sha256(token.encode()).digest(), is_refresh)
+    payload = token_cache.get(cache_key)
+    if payload is not None:
+        # Cached claims are only served until the token's own expiry
+        if payload.get("exp", 0) > time.time():
+            return dict(payload)
+        token_cache.invalidate(cache_key)
     try:
         secret = REFRESH_SECRET_KEY if is_refresh else SECRET_KEY
         payload = jwt.decode(token, secret, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    expires_in = payload.get("exp", 0) - time.time()
+    if expires_in > 0:
+        token_cache.set(cache_key, dict(payload), ttl=expires_in)
+    return payload
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user"""
-    credentials_exception = HTTPException(
+def _snapshot_user(user: User) -> User:
+    """Copy a loaded user into a session-independent instance for caching"""
+    return User(**{column.key: getattr(user, column.key) for column in User.__table__.columns})
+
+def invalidate_principal(user_id: int):
+    """Drop a cached principal after the user row changes"""
+    principal_cache.invalidate(user_id)
+    epoch_cache.invalidate(user_id)
+
+async def _evict_changed_users(since: int) -> int:
+    """Evict the cached principals of users journaled after since; return the highest seq seen"""
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            select(UserChange.seq, UserChange.user_id).where(UserChange.seq > since).order_by(UserChange.seq)
+        )).all()
+    for _, user_id in rows:
+        invalidate_principal(user_id)
+    return rows[-1].seq if rows else since
+
+async def _run_cache_invalidation():
+    """Follow the change journal so writes on any worker evict this worker's cached principals"""
+    async with AsyncSessionLocal() as db:
+        head = await change_head(db)
+    # (time, seq) checkpoints: on PostgreSQL a lower seq can commit up to CHANGE_FEED_LAG_SECONDS
+    # after a higher one, so entries are read again until they are that old
+    checkpoints = deque([(time.monotonic(), head)])
+    while True:
+        await asyncio.sleep(CACHE_INVALIDATION_SECONDS)
+        try:
+            while len(checkpoints) > 1 and checkpoints[1][0] <= time.monotonic() - CHANGE_FEED_LAG_SECONDS:
+                checkpoints.popleft()
+            head = await _evict_changed_users(checkpoints[0][1])
+            checkpoints.append((time.monotonic(), max(head, checkpoints[-1][1])))
+        except Exception:
+            logger.exception("Principal cache invalidation failed")
+
+def start_cache_invalidation():
+    """Start following the change journal (called on application startup)"""
+    global _invalidation_task
+    if _invalidation_task is None:
+        _invalidation_task = asyncio.create_task(_run_cache_invalidation())
+
+async def stop_cache_invalidation():
+    """Cancel the journal follower (called on application shutdown)"""
+    global _invalidation_task
+    if _invalidation_task is not None:
+        _invalidation_task.cancel()
+        _invalidation_task = None
+
+async def get_token_version(db: AsyncSession, user_id: int) -> Optional[int]:
+    """Current token version of a user (None if the user no longer exists)"""
+    version = epoch_cache.get(user_id)
+    if version is None:
+        version = await db.scalar(select(User.token_version).where(User.id == user_id))
+        if version is not None:
+            epoch_cache.set(user_id, version)
+    return version
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_read_db)
+) -> User:
+    """Get current authenticated user (loads the full user row)"""
+    credentials_exception = _credentials_exception()
     
     try:
         payload = verify_token(token)
@@ -82,12 +194,87 @@ async def get_current_user(
         user_id: int = int(user_id_str)
     except (JWTError, ValueError, TypeError):
         raise credentials_exception
+    if payload.get("type") != "access":
+        raise credentials_exception
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = principal_cache.get(user_id)
     if user is None:
+        db_user = await db.scalar(select(User).where(User.id == user_id))
+        if db_user is None:
+            raise credentials_exception
+        user = _snapshot_user(db_user)
+        principal_cache.set(user_id, user)
+        epoch_cache.set(user_id, user.token_version)
+    if payload.get("ver", 0) != user.token_version:
         raise credentials_exception
     return user
 
+async def _principal_from_token(db: AsyncSession, token: str, token_type: str) -> Principal:
+    credentials_exception = _credentials_exception()
+    
+    payload = verify_token(token)
+    if payload.get("type") != token_type:
+        raise credentials_exception
+    try:
+        user_id = int(payload["sub"])
+        role = UserRole(payload["role"])
+        token_version = int(payload.get("ver", 0))
+    except (KeyError, ValueError, TypeError):
+        raise credentials_exception
+    
+    if await get_token_version(db, user_id) != token_version:
+        raise credentials_exception
+    return Principal(id=user_id, role=role, token_version=token_version)
+
+async def get_current_principal(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+) -> Principal:
+    """Get the authenticated caller from the token claims without loading the user row.
+
+    Only the token version is checked against the database, and that
+    lookup is cached, so tokens issued before a role change are rejected.
+    """
+    return await _principal_from_token(db, token, "access")
+
+async def get_current_admin_principal(
+    principal: Principal = Depends(get_current_principal)
+) -> Principal:
+    """Get the authenticated caller from the token claims and verify admin role"""
+    if principal.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    return principal
+
+async def _admin_principal_in_own_session(token: str, token_type: str = "access") -> Principal:
+    # Yield dependencies (get_db) are closed only after a streaming response ends, so a
+    # session from one would keep a pooled connection for the whole stream
+    async with AsyncSessionLocal() as db:
+        principal = await _principal_from_token(db, token, token_type)
+    return await get_current_admin_principal(principal=principal)
+
+async def get_detached_admin_principal(
+    token: str = Depends(oauth2_scheme)
+) -> Principal:
+    """Admin principal for streaming endpoints; the database session is closed before the response starts"""
+    return await _admin_principal_in_own_session(token)
+
+async def get_stream_admin_principal(
+    request: Request,
+    ticket: Optional[str] = Query(None, description="Events ticket (EventSource cannot send an Authorization header)")
+) -> Principal:
+    """Admin principal for event streams, from an events ticket or the Authorization header.
+
+    Access tokens are never accepted in the query string, where they would
+    end up in access logs; the ticket only opens event streams and expires
+    after EVENTS_TICKET_EXPIRE_SECONDS.
+    """
+    if ticket is not None:
+        return await _admin_principal_in_own_session(ticket, "events")
+    return await _admin_principal_in_own_session(await oauth2_scheme(request))
+
 async def get_current_admin_user(
     current_user: User = Depends(get_current_user)
 ) -> User:
@@ -0,0 +1,106 @@
+"""
+Image blob garbage collection
+
+Profile images are stored once per content (app.uploads) and counted in
+image_blobs. ORM writes keep the counts through an after_flush hook in
+app.models; set-based deletes call release_images(). Request handlers
+never delete files: a background task in each worker deletes blobs whose
+refcount has been 0 for BLOB_GC_GRACE_SECONDS, in batches. Uploads are
+recorded with refcount 0 as soon as they are stored (track_blob), so a
+blob whose referencing write fails is collected too. The grace period
+covers the time until that write commits, and a blob re-uploaded just
+before it is collected. Re-uploading refreshes the file's mtime, and
+recently touched files are kept.
+"""
+import asyncio
+import logging
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import AsyncSessionLocal, write_lock
+from app.images import image_keys
+from app.models import ImageBlob, image_refcount_statement
+from app.storage import get_storage
+
+# Garbage collector settings (use environment variables)
+BLOB_GC_INTERVAL_SECONDS = float(os.getenv("BLOB_GC_INTERVAL_SECONDS", "60"))
+BLOB_GC_GRACE_SECONDS = float(os.getenv("BLOB_GC_GRACE_SECONDS", "300"))
+BLOB_GC_BATCH_SIZE = int(os.getenv("BLOB_GC_BATCH_SIZE", "500"))
+
+logger = logging.getLogger(__name__)
+
+_task: Optional[asyncio.Task] = None
+
+async def track_blob(image_path: str):
+    """Record a just-stored blob with no references yet (in its own transaction).
+
+    If the write that was to reference it fails, the blob is collected
+    like any other unreferenced blob once the grace period has passed.
+    """
+    async with AsyncSessionLocal() as db:
+        async with write_lock():
+            await db.execute(image_refcount_statement(db.get_bind().dialect.name, image_path, 0))
+            await db.commit()
+
+async def release_images(db: AsyncSession, image_paths: list):
+    """Drop one reference per path (call inside the transaction of a set-based delete)"""
+    dialect_name = db.get_bind().dialect.name
+    for path, count in Counter(path for path in image_paths if path).items():
+        await db.execute(image_refcount_statement(dialect_name, path, -count))
+
+def remove_blob_files(image_paths: list, cutoff: datetime):
+    """Delete the files of collected blobs, skipping any re-uploaded since the cutoff"""
+    storage = get_storage()
+    keys = []
+    for image_path in image_paths:
+        modified_at = storage.modified_at(image_keys(image_path)[0])
+        if modified_at is None or modified_at <= cutoff.timestamp():
+            keys += image_keys(image_path)
+    if keys:
+        storage.delete(keys)
+
+async def collect_garbage() -> int:
+    """Delete one batch of unreferenced blobs; return how many were collected"""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=BLOB_GC_GRACE_SECONDS)
+    async with AsyncSessionLocal() as db:
+        candidates = (
+            select(ImageBlob.path)
+            .where(ImageBlob.refcount <= 0, ImageBlob.released_at <= cutoff)
+            .limit(BLOB_GC_BATCH_SIZE)
+        )
+        async with write_lock():
+            # Re-check the refcount: a blob referenced again since selection is kept
+            paths = list((await db.scalars(
+                delete(ImageBlob)
+                .where(ImageBlob.path.in_(candidates.scalar_subquery()), ImageBlob.refcount <= 0)
+                .returning(ImageBlob.path)
+            )).all())
+            await db.commit()
+    if paths:
+        await asyncio.to_thread(remove_blob_files, paths, cutoff)
+    return len(paths)
+
+async def _run_garbage_collector():
+    while True:
+        await asyncio.sleep(BLOB_GC_INTERVAL_SECONDS)
+        try:
+            while await collect_garbage() >= BLOB_GC_BATCH_SIZE:
+                pass
+        except Exception:
+            logger.exception("Image garbage collection failed")
+
+def start_garbage_collector():
+    """Start the periodic garbage collector (called on application startup)"""
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_run_garbage_collector())
+
+async def stop_garbage_collector():
+    """Cancel the garbage collector (called on application shutdown)"""
+    global _task
+    if _task is not None:
+        _task.cancel()
+        _task = None
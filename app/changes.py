@@ -0,0 +1,49 @@
+"""
+User change journal and feed
+
+Every user create, update and delete appends a row to user_changes in the
+same transaction: ORM writes through the after_flush hook in app.models,
+set-based statements through record_changes(). The change feed reads the
+journal after a checkpoint sequence, so a sync costs as much as the number
+of changes, not the size of the users table.
+"""
+from datetime import timedelta
+import os
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import IS_SQLITE
+from app.models import User, UserChange
+
+# Change feed settings (use environment variables)
+CHANGE_FEED_MAX_LIMIT = int(os.getenv("CHANGE_FEED_MAX_LIMIT", "1000"))
+# SQLite commits one writer at a time, so seq order is commit order. On
+# PostgreSQL a lower seq can commit after a higher one; entries younger than
+# the lag are held back so a reader does not skip past them.
+CHANGE_FEED_LAG_SECONDS = float(os.getenv("CHANGE_FEED_LAG_SECONDS", "0" if IS_SQLITE else "5"))
+
+async def record_changes(db: AsyncSession, op: str, user_ids: list):
+    """Journal a set-based create/update/delete (call inside the writing transaction)"""
+    if user_ids:
+        await db.execute(insert(UserChange), [{"user_id": user_id, "op": op} for user_id in user_ids])
+
+async def change_head(db: AsyncSession) -> int:
+    """Sequence of the latest journaled change (0 if none)"""
+    return await db.scalar(select(func.max(UserChange.seq))) or 0
+
+async def read_changes(db: AsyncSession, since: int, limit: int) -> tuple:
+    """Journal entries after since, in order, with the current rows of the users they touch.
+
+    Returns (entries, users by id, has_more).
+    """
+    query = select(UserChange).where(UserChange.seq > since)
+    if CHANGE_FEED_LAG_SECONDS > 0:
+        query = query.where(UserChange.changed_at <= func.now() - timedelta(seconds=CHANGE_FEED_LAG_SECONDS))
+    entries = list((await db.scalars(query.order_by(UserChange.seq).limit(limit + 1))).all())
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    user_ids = {entry.user_id for entry in entries if entry.op != "deleted"}
+    users = {}
+    if user_ids:
+        users = {user.id: user for user in await db.scalars(select(User).where(User.id.in_(user_ids)))}
+    return entries, users, has_more
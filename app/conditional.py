@@ -0,0 +1,79 @@
+"""
+Conditional GET support for user resources
+
+User responses carry a strong ETag derived from id + updated_at (or
+created_at) and a Last-Modified header. Requests with If-None-Match or
+If-Modified-Since are answered with 304 Not Modified when nothing changed.
+List pages use an ETag built from a listing version, which changes on
+every insert, update and delete.
+"""
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+import hashlib
+from fastapi import Request, Response, status
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import User, UserChange
+
+def as_utc(value: datetime) -> datetime:
+    # SQLite returns naive datetimes; stored timestamps are UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+def make_etag(*parts) -> str:
+    """Strong ETag over the given parts"""
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+def user_validators(user_id: int, created_at: Optional[datetime], updated_at: Optional[datetime],
+                    variant: Optional[tuple] = None) -> tuple:
+    """(ETag, Last-Modified) of a user representation; variant is the sparse field set, if any"""
+    modified = updated_at or created_at
+    modified = as_utc(modified) if modified else None
+    etag = make_etag("user", user_id, modified.isoformat() if modified else "", ",".join(variant or ()))
+    return etag, modified
+
+def validator_headers(etag: str, modified: Optional[datetime] = None) -> dict:
+    """Response headers for an ETag and optional Last-Modified time"""
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if modified:
+        headers["Last-Modified"] = format_datetime(modified, usegmt=True)
+    return headers
+
+def is_not_modified(request: Request, etag: str, modified: Optional[datetime] = None) -> bool:
+    """Evaluate If-None-Match (preferred) or If-Modified-Since against the current validators"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return modified.replace(microsecond=0) <= as_utc(since)
+    return False
+
+def has_conditional_headers(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+def not_modified_response(etag: str, modified: Optional[datetime] = None) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=validator_headers(etag, modified))
+
+async def user_stamps(db: AsyncSession, user_id: int):
+    """(created_at, updated_at) of a user without loading the row, or None if it does not exist"""
+    return (await db.execute(select(User.created_at, User.updated_at).where(User.id == user_id))).first()
+
+async def listing_version(db: AsyncSession) -> str:
+    """Version of the users table as a whole, from three index lookups.
+
+    Every change made through the API moves the change journal sequence;
+    max(id) and max(updated_at) also catch rows written outside it.
+    """
+    row = (await db.execute(select(
+        select(func.max(User.id)).scalar_subquery(),
+        select(func.max(User.updated_at)).scalar_subquery(),
+        select(func.max(UserChange.seq)).scalar_subquery(),
+    ))).one()
+    return ":".join(str(value) for value in row)
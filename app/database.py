@@ -1,28 +1,189 @@
-from sqlalchemy import create_engine
+from contextlib import asynccontextmanager
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from fastapi import Request, Response
+import asyncio
 import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within a process
+    fcntl = None
 
 # SQLite database URL (can be changed to PostgreSQL)
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./user_management.db")
 
-# Create engine
+def to_async_url(url: str) -> str:
+    """Map a sync database URL to its async driver (aiosqlite / asyncpg)"""
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if dialect in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    return url
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# SQLite profile: "production" enables WAL and the PRAGMAs below on every connection
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "default")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # 256MB
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))  # negative = KiB, i.e. 64MB
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+# Serialize writers across worker processes with a lock file next to the database
+SQLITE_WRITE_LOCK = os.getenv(
+    "SQLITE_WRITE_LOCK", "1" if SQLITE_PROFILE == "production" else "0"
+) == "1"
+
+# Async database URL used by the API (defaults to DATABASE_URL with an async driver)
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", to_async_url(DATABASE_URL))
+
+# Optional read replica for read-only endpoints (same URL format as DATABASE_URL)
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+# After a write, the client's reads go to the primary for this long (read-your-writes)
+PRIMARY_STICKY_SECONDS = int(os.getenv("PRIMARY_STICKY_SECONDS", "5"))
+PRIMARY_STICKY_COOKIE = "db_primary_until"
+
+# Create engine (sync - used for table creation and scripts)
 engine = create_engine(
     DATABASE_URL,
     connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
 )
 
+# Create async engine (used by the API routers)
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+
+# Create read-only async engine (falls back to the primary when no replica is configured)
+async_read_engine = create_async_engine(to_async_url(DATABASE_READ_URL)) if DATABASE_READ_URL else async_engine
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Run the production PRAGMAs on a new SQLite connection"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+if IS_SQLITE and SQLITE_PROFILE == "production":
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    if async_read_engine is not async_engine and DATABASE_READ_URL.startswith("sqlite"):
+        event.listen(async_read_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
+class RoutingSession(Session):
+    """Session that reads from the replica until it writes, then sticks to the primary"""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or self.info.get("wrote"):
+            self.info["wrote"] = True
+            return async_engine.sync_engine
+        return async_read_engine.sync_engine
+
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Create AsyncSessionLocal class (objects stay readable after commit)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Create AsyncReadSessionLocal class (replica reads, primary once the session writes)
+AsyncReadSessionLocal = async_sessionmaker(
+    sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False
+)
+
 # Create Base class
 Base = declarative_base()
 
 # Dependency to get DB session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Dependency to get a DB session for read-only endpoints
+async def get_read_db(request: Request):
+    sticky_until = request.cookies.get(PRIMARY_STICKY_COOKIE, "")
+    if async_read_engine is async_engine or (sticky_until.isdigit() and int(sticky_until) > time.time()):
+        session_factory = AsyncSessionLocal
+    else:
+        session_factory = AsyncReadSessionLocal
+    async with session_factory() as db:
         yield db
-    finally:
-        db.close()
 
+def stick_to_primary(response: Response):
+    """Route this client's reads to the primary for a few seconds after a write"""
+    if async_read_engine is not async_engine:
+        response.set_cookie(
+            PRIMARY_STICKY_COOKIE,
+            str(int(time.time()) + PRIMARY_STICKY_SECONDS),
+            max_age=PRIMARY_STICKY_SECONDS,
+            httponly=True,
+            samesite="lax",
+        )
+
+_write_mutex = asyncio.Lock()
+_write_lock_fd = None
+
+def _acquire_write_lock_file():
+    """Block until this process holds the cross-worker write lock"""
+    global _write_lock_fd
+    if _write_lock_fd is None:
+        database = make_url(DATABASE_URL).database
+        _write_lock_fd = os.open(f"{database}.write-lock", os.O_RDWR | os.O_CREAT, 0o644)
+    fcntl.flock(_write_lock_fd, fcntl.LOCK_EX)
+
+def _release_write_lock_file():
+    fcntl.flock(_write_lock_fd, fcntl.LOCK_UN)
+
+@asynccontextmanager
+async def write_lock():
+    """Serialize SQLite write transactions across coroutines and worker processes.
+
+    Wrap the flush/commit of a write in this so that workers queue for the
+    single SQLite writer instead of failing with "database is locked".
+    It is a no-op unless SQLITE_WRITE_LOCK is enabled.
+    """
+    if not (IS_SQLITE and SQLITE_WRITE_LOCK):
+        yield
+        return
+    async with _write_mutex:
+        if fcntl is None:
+            yield
+            return
+        await asyncio.to_thread(_acquire_write_lock_file)
+        try:
+            yield
+        finally:
+            _release_write_lock_file()
+
+
+def upgrade_schema(bind):
+    """Add columns and indexes introduced after a table was first created.
+
+    create_all() only creates missing tables, so new columns (which must be
+    nullable or have a server default) and new indexes are added to
+    existing tables here.
+    """
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                if not column.nullable:
+                    ddl += " NOT NULL"
+                conn.exec_driver_sql(ddl)
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
@@ -0,0 +1,172 @@
+"""
+Live user events for the admin pages (Server-Sent Events)
+
+Each worker runs one broker task that follows the user_changes journal
+(app.changes) and fans new entries out to that worker's subscribers. The
+journal lives in the database, so a change committed by any uvicorn worker
+reaches subscribers on every worker. Routes call notify_user_changes()
+after a write to wake the local broker at once; other workers pick the
+change up within EVENTS_POLL_SECONDS.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Optional
+from app.changes import change_head, read_changes
+from app.database import AsyncSessionLocal
+from app.schemas import UserResponse, UserStats
+from app.stats import STATS_REFRESH_SECONDS, get_stats
+
+# Event stream settings (use environment variables)
+EVENTS_POLL_SECONDS = float(os.getenv("EVENTS_POLL_SECONDS", "1"))
+EVENTS_KEEPALIVE_SECONDS = float(os.getenv("EVENTS_KEEPALIVE_SECONDS", "15"))
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "1000"))  # per subscriber; slower subscribers are dropped
+EVENTS_REPLAY_LIMIT = int(os.getenv("EVENTS_REPLAY_LIMIT", "1000"))  # changes replayed after Last-Event-ID
+EVENTS_MAX_STREAM_SECONDS = float(os.getenv("EVENTS_MAX_STREAM_SECONDS", "300"))  # clients reconnect and re-authenticate
+EVENTS_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+def format_event(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    """Encode one SSE message"""
+    message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return f"id: {event_id}\n{message}" if event_id is not None else message
+
+def change_messages(entries, users) -> list:
+    """(seq, SSE message) for each journal entry, with the user's current state"""
+    messages = []
+    for entry in entries:
+        user = users.get(entry.user_id) if entry.op != "deleted" else None
+        data = {
+            "user_id": entry.user_id,
+            "user": UserResponse.model_validate(user).model_dump(mode="json") if user else None,
+        }
+        messages.append((entry.seq, format_event(entry.op, data, entry.seq)))
+    return messages
+
+async def stats_message(db) -> tuple:
+    """(refreshed_at, SSE message) with the current dashboard stats"""
+    stats = UserStats.model_validate(await get_stats(db))
+    return stats.refreshed_at, format_event("stats", stats.model_dump(mode="json"))
+
+class EventBroker:
+    """Per-worker fan-out of journaled user changes and refreshed stats"""
+
+    def __init__(self):
+        self.subscribers: set = set()
+        self.last_seq = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stats_pending_until = 0.0
+        self._stats_refreshed_at = None
+
+    async def subscribe(self) -> tuple:
+        """Register a subscriber; return (queue, journal head at subscription)"""
+        async with AsyncSessionLocal() as db:
+            head = await change_head(db)
+        if not self.subscribers:
+            # Idle brokers do not poll; skip the backlog nobody was listening to
+            self.last_seq = max(self.last_seq, head)
+        queue = asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        return queue, head
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    def notify(self):
+        """Wake the broker after a local write"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def stop(self):
+        """Cancel the broker task (called on application shutdown)"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _broadcast(self, item: tuple):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(item)
+            except asyncio.QueueFull:
+                # The client resumes from its Last-Event-ID when it reconnects
+                self.subscribers.discard(queue)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), EVENTS_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not self.subscribers:
+                continue
+            try:
+                await self._poll()
+            except Exception:
+                logger.exception("User event poll failed")
+
+    async def _poll(self):
+        async with AsyncSessionLocal() as db:
+            has_more = True
+            while has_more:
+                entries, users, has_more = await read_changes(db, self.last_seq, EVENTS_BATCH_SIZE)
+                if not entries:
+                    break
+                for item in change_messages(entries, users):
+                    self._broadcast(item)
+                self.last_seq = entries[-1].seq
+                # A worker's refresher picks the change up within two refresh intervals
+                self._stats_pending_until = time.monotonic() + 2 * STATS_REFRESH_SECONDS + EVENTS_POLL_SECONDS
+            # The stats summary refreshes in the background; push it once it has caught up
+            if time.monotonic() < self._stats_pending_until:
+                refreshed_at, message = await stats_message(db)
+                if refreshed_at != self._stats_refreshed_at:
+                    self._stats_refreshed_at = refreshed_at
+                    self._broadcast((None, message))
+
+broker = EventBroker()
+
+def notify_user_changes():
+    """Hook for routes that create, update or delete users"""
+    broker.notify()
+
+async def event_stream(last_event_id: Optional[int] = None):
+    """SSE messages for one subscriber: current stats, any replay after last_event_id, then live events"""
+    queue, head = await broker.subscribe()
+    try:
+        sent_seq = head if last_event_id is None else last_event_id
+        async with AsyncSessionLocal() as db:
+            _, message = await stats_message(db)
+            yield message
+            if last_event_id is not None:
+                entries, users, has_more = await read_changes(db, last_event_id, EVENTS_REPLAY_LIMIT)
+                if has_more:
+                    # Too far behind to replay: the client reloads its view
+                    sent_seq = await change_head(db)
+                    yield format_event("reset", {}, sent_seq)
+                else:
+                    for seq, message in change_messages(entries, users):
+                        sent_seq = seq
+                        yield message
+
+        deadline = time.monotonic() + EVENTS_MAX_STREAM_SECONDS
+        while time.monotonic() < deadline and queue in broker.subscribers:
+            try:
+                seq, message = await asyncio.wait_for(queue.get(), EVENTS_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if seq is not None:
+                if seq <= sent_seq:
+                    continue  # Already replayed
+                sent_seq = seq
+            yield message
+    finally:
+        broker.unsubscribe(queue)
@@ -0,0 +1,67 @@
+"""
+Sparse fieldsets for user read endpoints
+
+Clients pass ?fields=id,name,profile_image to receive only those fields.
+The SQL SELECT is narrowed to the matching columns and the response is
+serialized with a model built for exactly that field set.
+"""
+from functools import lru_cache
+from typing import Optional
+from fastapi import HTTPException, Response, status
+from pydantic import ConfigDict, create_model
+from app.models import User
+from app.schemas import UserResponse, PaginatedResponse, BatchUsersResponse
+
+USER_FIELDS = tuple(UserResponse.model_fields)
+
+def parse_fields(fields: Optional[str]) -> Optional[tuple]:
+    """Validate a comma-separated field list; return it in UserResponse order, or None for all fields.
+
+    id is always included.
+    """
+    if not fields:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(USER_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+    requested.add("id")
+    return tuple(name for name in USER_FIELDS if name in requested)
+
+def user_columns(field_names: tuple) -> list:
+    """User columns to SELECT for a field set"""
+    return [getattr(User, name) for name in field_names]
+
+@lru_cache(maxsize=128)
+def sparse_user_model(field_names: tuple):
+    """UserResponse narrowed to the given fields"""
+    return create_model(
+        f"UserResponse[{','.join(field_names)}]",
+        __config__=ConfigDict(from_attributes=True),
+        **{name: (UserResponse.model_fields[name].annotation, UserResponse.model_fields[name]) for name in field_names},
+    )
+
+@lru_cache(maxsize=128)
+def sparse_page_model(field_names: tuple):
+    """PaginatedResponse whose data items are narrowed to the given fields"""
+    return create_model(
+        f"PaginatedResponse[{','.join(field_names)}]",
+        __base__=PaginatedResponse,
+        data=(list[sparse_user_model(field_names)], ...),
+    )
+
+@lru_cache(maxsize=128)
+def sparse_batch_model(field_names: tuple):
+    """BatchUsersResponse whose data items are narrowed to the given fields"""
+    return create_model(
+        f"BatchUsersResponse[{','.join(field_names)}]",
+        __base__=BatchUsersResponse,
+        data=(list[Optional[sparse_user_model(field_names)]], ...),
+    )
+
+def sparse_response(model, content, headers: Optional[dict] = None) -> Response:
+    """Serialize content (a dict, ORM object or row) with a sparse model"""
+    return Response(model.model_validate(content).model_dump_json(), media_type="application/json", headers=headers)
@@ -0,0 +1,95 @@
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+# Hashing executor settings (use environment variables)
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "process")  # "process" or "thread"
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))  # uvicorn worker processes, each with its own pool
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "0")) or max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", "64"))  # max in-flight hash jobs per worker
+HASH_TIMEOUT_SECONDS = float(os.getenv("HASH_TIMEOUT_SECONDS", "10"))
+# Max hash jobs a bulk import keeps queued, leaving a worker free for logins and registrations
+HASH_IMPORT_WORKERS = int(os.getenv("HASH_IMPORT_WORKERS", "0")) or max(1, HASH_WORKERS - 1)
+
+# Password hashing
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+_executor: Optional[Executor] = None
+_in_flight = 0
+_import_slots = asyncio.Semaphore(HASH_IMPORT_WORKERS)
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash"""
+    return pwd_context.verify(plain_password, hashed_password)
+
+def get_password_hash(password: str) -> str:
+    """Hash a password"""
+    return pwd_context.hash(password)
+
+def get_hash_executor() -> Executor:
+    """Return the shared hashing executor, creating it on first use"""
+    global _executor
+    if _executor is None:
+        if HASH_EXECUTOR == "thread":
+            _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="hash")
+        else:
+            _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+    return _executor
+
+def shutdown_hash_executor():
+    """Stop the hashing executor (called on application shutdown)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+async def _run_hash_job(func, *args):
+    """Run a hashing function off the event loop with a queue limit and timeout"""
+    global _in_flight
+    if _in_flight >= HASH_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    _in_flight += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(
+            loop.run_in_executor(get_hash_executor(), func, *args),
+            timeout=HASH_TIMEOUT_SECONDS,
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Password hashing timed out, please retry",
+            headers={"Retry-After": "1"},
+        )
+    finally:
+        _in_flight -= 1
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password in the hashing executor"""
+    return await _run_hash_job(get_password_hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash in the hashing executor"""
+    return await _run_hash_job(verify_password, plain_password, hashed_password)
+
+async def hash_passwords_async(passwords: list[str]) -> list[str]:
+    """Hash many passwords in the hashing executor (bulk imports)
+
+    At most HASH_IMPORT_WORKERS jobs from imports are queued at a time, so
+    interactive hashes wait for one import hash at most instead of a batch.
+    """
+    executor = get_hash_executor()
+    loop = asyncio.get_running_loop()
+
+    async def hash_one(password: str) -> str:
+        async with _import_slots:
+            return await loop.run_in_executor(executor, get_password_hash, password)
+
+    return list(await asyncio.gather(*(hash_one(password) for password in passwords)))
@@ -0,0 +1,162 @@
+"""
+In-memory index of registered emails and phone numbers
+
+Each worker keeps a Bloom filter of every user's email and phone. A
+negative answer is definite, so availability checks and the uniqueness
+checks in register/update only query the database on a possible hit
+(about IDENTIFIER_FILTER_FALSE_POSITIVE_RATE of unknown values).
+
+The filter is built in the background at startup. Until it is ready,
+every lookup goes to the database. Routes add identifiers as soon as they
+commit. Changes made by other workers arrive by following the
+user_changes journal (app.changes) every IDENTIFIER_FILTER_SYNC_SECONDS.
+The unique constraints stay the final word for the short window before a
+sync. Bloom filters cannot forget: deleted users and old identifiers
+remain possible hits until the filter is rebuilt, which happens once they
+make up IDENTIFIER_FILTER_REBUILD_RATIO of its entries or the filter
+outgrows its capacity.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import os
+from typing import Optional
+from sqlalchemy import select
+from app.changes import change_head, read_changes
+from app.database import AsyncSessionLocal
+from app.models import User
+
+# Identifier filter settings (use environment variables)
+IDENTIFIER_FILTER_FALSE_POSITIVE_RATE = float(os.getenv("IDENTIFIER_FILTER_FALSE_POSITIVE_RATE", "0.01"))
+IDENTIFIER_FILTER_MIN_CAPACITY = int(os.getenv("IDENTIFIER_FILTER_MIN_CAPACITY", "100000"))  # identifiers
+IDENTIFIER_FILTER_SYNC_SECONDS = float(os.getenv("IDENTIFIER_FILTER_SYNC_SECONDS", "1"))
+IDENTIFIER_FILTER_REBUILD_RATIO = float(os.getenv("IDENTIFIER_FILTER_REBUILD_RATIO", "0.2"))
+IDENTIFIER_FILTER_BATCH_SIZE = 5000
+
+logger = logging.getLogger(__name__)
+
+class BloomFilter:
+    """Fixed-size Bloom filter of strings (double hashing over one BLAKE2b digest)"""
+
+    def __init__(self, capacity: int, false_positive_rate: float):
+        self.size = max(8, int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.count = 0
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, value: str):
+        if value in self:
+            return  # Keep count close to the number of distinct values
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+def _key(kind: str, value: str) -> str:
+    return f"{kind}:{value}"
+
+class IdentifierIndex:
+    """Per-worker Bloom filter of user emails and phones, kept in step with the change journal"""
+
+    def __init__(self):
+        self.filter: Optional[BloomFilter] = None
+        self.last_seq = 0
+        self.stale = 0  # Entries of deleted users (or replaced identifiers) still in the filter
+        self._task: Optional[asyncio.Task] = None
+
+    def might_exist(self, kind: str, value: str) -> bool:
+        """False only if no user has this email/phone (kind is "email" or "phone")"""
+        if self.filter is None:
+            return True
+        return _key(kind, value) in self.filter
+
+    def add(self, email: Optional[str] = None, phone: Optional[str] = None):
+        """Record identifiers of a user that was just created or updated"""
+        if self.filter is None:
+            return
+        if email:
+            self.filter.add(_key("email", email))
+        if phone:
+            self.filter.add(_key("phone", phone))
+
+    def discard(self, count: int = 1):
+        """Note identifiers that no longer belong to a user (they stay in the filter until a rebuild)"""
+        self.stale += count
+
+    async def build(self):
+        """Build a new filter from the users table and swap it in"""
+        async with AsyncSessionLocal() as db:
+            # Journal entries after this point are replayed by sync(), so nothing is missed
+            head = await change_head(db)
+            user_count = await db.scalar(select(User.id).order_by(User.id.desc()).limit(1)) or 0
+            # Two identifiers per user, with room for as many again before the next rebuild
+            bloom = BloomFilter(
+                max(IDENTIFIER_FILTER_MIN_CAPACITY, 4 * user_count), IDENTIFIER_FILTER_FALSE_POSITIVE_RATE
+            )
+            result = await db.stream(
+                select(User.email, User.phone).execution_options(yield_per=IDENTIFIER_FILTER_BATCH_SIZE)
+            )
+            async for batch in result.partitions():
+                for email, phone in batch:
+                    bloom.add(_key("email", email))
+                    bloom.add(_key("phone", phone))
+        self.filter = bloom
+        self.last_seq = max(self.last_seq, head)
+        self.stale = 0
+        logger.info("Identifier filter built with %d entries", bloom.count)
+
+    async def sync(self):
+        """Apply journaled changes from every worker; rebuild once the filter has gone stale"""
+        async with AsyncSessionLocal() as db:
+            has_more = True
+            while has_more:
+                entries, users, has_more = await read_changes(db, self.last_seq, IDENTIFIER_FILTER_BATCH_SIZE)
+                if not entries:
+                    break
+                for entry in entries:
+                    if entry.op == "deleted":
+                        self.discard(2)
+                    elif entry.user_id in users:
+                        user = users[entry.user_id]
+                        self.add(user.email, user.phone)
+                self.last_seq = entries[-1].seq
+        bloom = self.filter
+        if bloom.count > bloom.capacity or self.stale > bloom.count * IDENTIFIER_FILTER_REBUILD_RATIO:
+            await self.build()
+
+    async def _run(self):
+        while self.filter is None:
+            try:
+                await self.build()
+            except Exception:
+                logger.exception("Identifier filter build failed")
+                await asyncio.sleep(IDENTIFIER_FILTER_SYNC_SECONDS)
+        while True:
+            await asyncio.sleep(IDENTIFIER_FILTER_SYNC_SECONDS)
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("Identifier filter sync failed")
+
+    def start(self):
+        """Build the filter and keep it in sync in the background (called on application startup)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the background task (called on application shutdown)"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+identifier_index = IdentifierIndex()
@@ -0,0 +1,108 @@
+"""
+Profile image variants
+
+After an upload is saved, process_profile_image() runs as a background task:
+Pillow renders square WebP thumbnails (THUMBNAIL_SIZES) and a full-size
+WebP copy in a process pool, then the variant URLs are stored on the user
+(profile_image_variants) so responses can point small avatars at small
+files. Variants are stored next to the original and named after it, so
+a deduplicated image shares its variants and the garbage collector
+(app.blobs) removes them together.
+"""
+import asyncio
+import io
+import logging
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Optional
+from PIL import Image, ImageOps
+from sqlalchemy import select
+from app.auth import invalidate_principal
+from app.database import AsyncSessionLocal, write_lock
+from app.models import User
+from app.events import notify_user_changes
+from app.storage import get_storage, storage_key
+
+# Image pipeline settings (use environment variables)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))  # uvicorn worker processes, each with its own pool
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "0")) or max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)
+THUMBNAIL_SIZES = tuple(int(size) for size in os.getenv("THUMBNAIL_SIZES", "64,256").split(","))
+WEBP_QUALITY = int(os.getenv("WEBP_QUALITY", "80"))
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", "25000000"))  # larger images are not processed
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[Executor] = None
+
+def variant_urls(image_path: str) -> dict:
+    """Variant URLs for an image: one per thumbnail size, plus "webp" for the full-size copy"""
+    stem, _ = os.path.splitext(image_path)
+    variants = {str(size): f"{stem}_{size}.webp" for size in THUMBNAIL_SIZES}
+    variants["webp"] = f"{stem}.webp"
+    return variants
+
+def image_keys(image_path: str) -> list:
+    """Storage keys for an image URL: the original and its variants"""
+    return [storage_key(path) for path in [image_path, *variant_urls(image_path).values()]]
+
+def _save_webp(image: Image.Image, url: str):
+    buffer = io.BytesIO()
+    image.save(buffer, "WEBP", quality=WEBP_QUALITY)
+    get_storage().write_bytes(storage_key(url), buffer.getvalue())
+
+def generate_variants(image_path: str) -> dict:
+    """Render the WebP variants of an uploaded image (runs in the image executor)"""
+    variants = variant_urls(image_path)
+    with Image.open(io.BytesIO(get_storage().read_bytes(storage_key(image_path)))) as image:
+        width, height = image.size
+        if width * height > IMAGE_MAX_PIXELS:
+            raise ValueError(f"Image is too large to process ({width}x{height})")
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if image.mode in ("LA", "P", "PA") else "RGB")
+        for key, url in variants.items():
+            if key == "webp":
+                _save_webp(image, url)
+            else:
+                size = int(key)
+                _save_webp(ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS), url)
+    return variants
+
+def get_image_executor() -> Executor:
+    """Return the shared image executor, creating it on first use"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _executor
+
+def shutdown_image_executor():
+    """Stop the image executor (called on application shutdown)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+async def process_profile_image(user_id: int, image_path: str):
+    """Generate variants for a new profile image and record them on the user (background task)"""
+    storage = get_storage()
+    if all(await asyncio.gather(*(asyncio.to_thread(storage.exists, key) for key in image_keys(image_path)))):
+        # Same content uploaded before: its variants are already on disk
+        variants = variant_urls(image_path)
+    else:
+        loop = asyncio.get_running_loop()
+        try:
+            variants = await loop.run_in_executor(get_image_executor(), generate_variants, image_path)
+        except Exception:
+            logger.exception("Could not generate variants for %s", image_path)
+            return
+
+    async with AsyncSessionLocal() as db:
+        user = await db.scalar(select(User).where(User.id == user_id))
+        if user is None or user.profile_image != image_path:
+            # Replaced or deleted meanwhile; the garbage collector removes unreferenced files
+            return
+        user.profile_image_variants = variants
+        async with write_lock():
+            await db.commit()
+    invalidate_principal(user_id)
+    notify_user_changes()
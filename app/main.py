@@ -1,10 +1,21 @@
 from fastapi import FastAPI, Request
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine, Base
+from app.database import engine, async_engine, async_read_engine, Base, upgrade_schema
 from app.routers import auth, users
+from app.hashing import shutdown_hash_executor
+from app.images import shutdown_image_executor
+from app.blobs import start_garbage_collector, stop_garbage_collector
+from app.identifiers import identifier_index
+from app.stats import start_stats_refresher, stop_stats_refresher
+from app.auth import principal_cache, token_cache, start_cache_invalidation, stop_cache_invalidation
+from app.cache import count_cache
+from app.search import ensure_search_index
+from app.events import broker
+from app.uploads import UploadSizeLimitMiddleware
+from app.storage import STORAGE_BACKEND, S3_URL_EXPIRES_SECONDS, get_storage
+from app.assets import FingerprintedStaticFiles, UploadFiles, static_url
 import os
 
 # Create necessary directories if they don't exist
@@ -13,6 +24,8 @@ os.makedirs("data", exist_ok=True)
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
+ensure_search_index(engine)
 
 app = FastAPI(
     title="User Management System API",
@@ -22,6 +35,29 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+@app.on_event("startup")
+async def startup():
+    start_garbage_collector()
+    identifier_index.start()
+    start_stats_refresher()
+    start_cache_invalidation()
+
+@app.on_event("shutdown")
+async def shutdown():
+    shutdown_hash_executor()
+    shutdown_image_executor()
+    await broker.stop()
+    await stop_garbage_collector()
+    await identifier_index.stop()
+    await stop_stats_refresher()
+    await stop_cache_invalidation()
+    await async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
+
+# Cap multipart upload bodies while they stream in (added first so CORS wraps its 413s)
+app.add_middleware(UploadSizeLimitMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -32,9 +68,21 @@ app.add_middleware(
 )
 
 # Mount static files and templates
-app.mount("/static", StaticFiles(directory="static"), name="static")
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# Fingerprinted and content-addressed URLs are cached by browsers as immutable
+app.mount("/static", FingerprintedStaticFiles(directory="static"), name="static")
+if STORAGE_BACKEND == "s3":
+    @app.get("/uploads/{key:path}", include_in_schema=False)
+    async def uploaded_image(key: str):
+        """Send clients to the image in object storage; its bytes never pass through the app"""
+        return RedirectResponse(
+            get_storage().download_url(key),
+            status_code=307,
+            headers={"Cache-Control": f"private, max-age={S3_URL_EXPIRES_SECONDS // 2}"},
+        )
+else:
+    app.mount("/uploads", UploadFiles(directory="uploads"), name="uploads")
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["static_url"] = static_url
 
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
@@ -43,21 +91,30 @@ app.include_router(users.router, prefix="/api/users", tags=["Users"])
 # Admin panel routes
 @app.get("/", response_class=HTMLResponse)
 async def admin_dashboard(request: Request):
-    return templates.TemplateResponse("admin_dashboard.html", {"request": request})
+    return templates.TemplateResponse(request, "admin_dashboard.html")
 
 @app.get("/admin/login", response_class=HTMLResponse)
 async def admin_login_page(request: Request):
-    return templates.TemplateResponse("admin_login.html", {"request": request})
+    return templates.TemplateResponse(request, "admin_login.html")
 
 @app.get("/admin/users", response_class=HTMLResponse)
 async def admin_users_page(request: Request):
-    return templates.TemplateResponse("admin_users.html", {"request": request})
+    return templates.TemplateResponse(request, "admin_users.html")
 
 @app.get("/admin/users/{user_id}", response_class=HTMLResponse)
 async def admin_user_detail(request: Request, user_id: int):
-    return templates.TemplateResponse("admin_user_detail.html", {"request": request, "user_id": user_id})
+    return templates.TemplateResponse(request, "admin_user_detail.html", {"user_id": user_id})
 
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "message": "User Management System API is running"}
 
+
+@app.get("/health/cache")
+async def cache_stats():
+    """Hit/miss counters of the in-process caches for this worker"""
+    return {
+        "principal": principal_cache.stats(),
+        "token": token_cache.stats(),
+        "count": count_cache.stats(),
+    }
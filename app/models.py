@@ -1,14 +1,30 @@
-from sqlalchemy import Column, Integer, String, DateTime, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Enum, Index, JSON, case, event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
+from collections import Counter
+from datetime import datetime, timezone
 import enum
+import secrets
 from app.database import Base
 
 class UserRole(str, enum.Enum):
     USER = "user"
     ADMIN = "admin"
 
+def new_token_version() -> int:
+    return secrets.randbelow(2 ** 30)  # Leaves room for bumps within a 32-bit integer
+
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Keyset pagination order for GET /api/users
+        Index("ix_users_created_at_id", "created_at", "id"),
+        # Listing version (max(updated_at)) for conditional GET /api/users
+        Index("ix_users_updated_at", "updated_at"),
+        # Never reuse the id of a deleted user: tokens are matched to users by id
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False)
@@ -16,12 +32,122 @@ class User(Base):
     phone = Column(String(15), unique=True, index=True, nullable=False)
     password = Column(String(255), nullable=False)  # Hashed password
     profile_image = Column(String(255), nullable=True)
+    profile_image_variants = Column(JSON, nullable=True)  # Thumbnail/WebP URLs, set by app.images
     address = Column(String(150), nullable=True)
     state = Column(String(50), nullable=False)
     city = Column(String(50), nullable=False)
     country = Column(String(50), nullable=False)
     pincode = Column(String(10), nullable=False)
     role = Column(Enum(UserRole), default=UserRole.USER, nullable=False)
+    # Bumped to revoke issued tokens. Starts random, so a token of a deleted user never matches a
+    # new user given the same id (SQLite tables created without AUTOINCREMENT reuse the highest id)
+    token_version = Column(Integer, default=new_token_version, server_default="0", nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Set in Python for sub-second precision (SQLite's now() has whole seconds); used in ETags
+    updated_at = Column(DateTime(timezone=True), onupdate=lambda: datetime.now(timezone.utc))
+
+
+class UserChange(Base):
+    """Change journal: one row per created, updated or deleted user, in commit order (seq).
+
+    Rows for deleted users are the tombstones read by the change feed.
+    """
+    __tablename__ = "user_changes"
+    __table_args__ = {"sqlite_autoincrement": True}  # Never reuse a seq
+
+    seq = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    op = Column(String(10), nullable=False)  # created, updated or deleted
+    changed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+@event.listens_for(User.role, "set")
+def bump_token_version_on_role_change(target, value, oldvalue, initiator):
+    """Changing the role of a stored user invalidates tokens carrying the old role claim"""
+    if value != oldvalue and inspect(target).has_identity:
+        target.token_version = (target.token_version or 0) + 1
+
+
+class UserStat(Base):
+    """Precomputed user count for one dimension value (summary table refreshed by app.stats)"""
+    __tablename__ = "user_stats"
+
+    dimension = Column(String(20), primary_key=True)  # total, role, country, state, city or signup_day
+    value = Column(String(100), primary_key=True)
+    count = Column(Integer, nullable=False)
+    version = Column(String(100), nullable=False)  # Listing version the counts were computed at
+    refreshed_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class ImageBlob(Base):
+    """Content-addressed profile image (app.uploads) and the number of users referencing it.
+
+    Blobs whose refcount has dropped to 0 are deleted by the garbage
+    collector in app.blobs.
+    """
+    __tablename__ = "image_blobs"
+    __table_args__ = (
+        Index("ix_image_blobs_refcount_released_at", "refcount", "released_at"),
+    )
+
+    path = Column(String(255), primary_key=True)  # URL path of the original, e.g. /uploads/ab/ab12...ef.png
+    refcount = Column(Integer, nullable=False, default=0, server_default="0")
+    released_at = Column(DateTime(timezone=True), nullable=True)  # When the last reference was dropped
+
+
+def image_refcount_statement(dialect_name: str, path: str, delta: int):
+    """Upsert adding delta to the refcount of the blob at path"""
+    table = ImageBlob.__table__
+    now = datetime.now(timezone.utc)
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    statement = dialect_insert(table).values(path=path, refcount=delta, released_at=now if delta <= 0 else None)
+    refcount = table.c.refcount + statement.excluded.refcount
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.path],
+        set_={"refcount": refcount, "released_at": case((refcount <= 0, now), else_=table.c.released_at)},
+    )
+
+
+def image_reference_deltas(session) -> Counter:
+    """Profile image references added (+1) and dropped (-1) by the pending ORM changes"""
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, User) and obj.profile_image:
+            deltas[obj.profile_image] += 1
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            history = inspect(obj).attrs.profile_image.history
+            for path in history.deleted:
+                if path:
+                    deltas[path] -= 1
+            for path in history.added:
+                if path:
+                    deltas[path] += 1
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            path = inspect(obj).attrs.profile_image.loaded_value
+            if isinstance(path, str) and path:
+                deltas[path] -= 1
+    return deltas
+
+
+@event.listens_for(Session, "after_flush")
+def count_image_references(session, flush_context):
+    """Keep image_blobs refcounts in step with users.profile_image (set-based deletes call app.blobs.release_images)"""
+    connection = session.connection()
+    for path, delta in image_reference_deltas(session).items():
+        if delta:
+            connection.execute(image_refcount_statement(connection.dialect.name, path, delta))
+
 
+@event.listens_for(Session, "after_flush")
+def record_user_changes(session, flush_context):
+    """Journal users created, updated or deleted through the ORM (set-based statements call record_changes)"""
+    changes = [{"user_id": obj.id, "op": "created"} for obj in session.new if isinstance(obj, User)]
+    changes += [
+        {"user_id": obj.id, "op": "updated"} for obj in session.dirty
+        if isinstance(obj, User) and session.is_modified(obj)
+    ]
+    changes += [{"user_id": obj.id, "op": "deleted"} for obj in session.deleted if isinstance(obj, User)]
+    if changes:
+        session.connection().execute(UserChange.__table__.insert(), changes)
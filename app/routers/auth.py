@@ -1,60 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query, UploadFile, File, Form, Request, Response
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db, write_lock, stick_to_primary
 from app.models import User, UserRole
-from app.schemas import UserRegister, UserLogin, TokenResponse, RefreshToken, UserResponse
+from app.schemas import UserRegister, UserLogin, TokenResponse, RefreshToken, UserResponse, AvailabilityResponse
+from app.hashing import hash_password_async, verify_password_async
 from app.auth import (
-    get_password_hash,
-    verify_password,
     create_access_token,
     create_refresh_token,
     verify_token,
+    user_token_claims,
     get_current_user
 )
+from app.events import notify_user_changes
+from app.fieldsets import parse_fields, sparse_user_model, sparse_response
+from app.conditional import user_validators, validator_headers, is_not_modified, not_modified_response
+from app.uploads import save_uploaded_file
+from app.images import process_profile_image
+from app.identifiers import identifier_index
+from pydantic import EmailStr, TypeAdapter, ValidationError
 from typing import Optional, Union
-import os
-import aiofiles
 
 router = APIRouter()
 
-# Allowed image extensions
-ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png"}
-MAX_FILE_SIZE = 2 * 1024 * 1024  # 2MB
-
-async def save_uploaded_file(file: UploadFile, user_id: int) -> str:
-    """Save uploaded file and return the file path"""
-    # Get file extension
-    file_ext = os.path.splitext(file.filename)[1].lower()
-    if file_ext not in ALLOWED_EXTENSIONS:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Only JPG and PNG files are allowed"
-        )
-    
-    # Read file content
-    content = await file.read()
-    
-    # Check file size
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="File size must be less than 2MB"
-        )
-    
-    # Generate filename
-    filename = f"user_{user_id}_{file.filename}"
-    filepath = os.path.join("uploads", filename)
-    
-    # Save file
-    async with aiofiles.open(filepath, 'wb') as f:
-        await f.write(content)
-    
-    return f"/uploads/{filename}"
+email_adapter = TypeAdapter(EmailStr)
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def register(
     request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
     name: Optional[str] = Form(None),
     email: Optional[str] = Form(None),
     phone: Optional[str] = Form(None),
@@ -65,7 +42,7 @@ async def register(
     pincode: Optional[str] = Form(None),
     address: Optional[str] = Form(None),
     profile_image: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Register a new user - Supports both JSON and multipart/form-data"""
     
@@ -110,24 +87,26 @@ async def register(
                 detail=f"Validation error: {str(e)}"
             )
     
-    # Check if email already exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
-    if existing_user:
+    # Check if email already exists (the identifier filter rules out most new values without a query)
+    if identifier_index.might_exist("email", user_data.email) and await db.scalar(
+        select(User.id).where(User.email == user_data.email)
+    ):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
     # Check if phone already exists
-    existing_phone = db.query(User).filter(User.phone == user_data.phone).first()
-    if existing_phone:
+    if identifier_index.might_exist("phone", user_data.phone) and await db.scalar(
+        select(User.id).where(User.phone == user_data.phone)
+    ):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Phone number already registered"
         )
     
     # Hash password
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await hash_password_async(user_data.password)
     
     # Create user
     db_user = User(
@@ -144,26 +123,84 @@ async def register(
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    try:
+        async with write_lock():
+            await db.commit()
+    except IntegrityError:
+        # Registered concurrently (possibly on another worker) since the checks above
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email or phone number already registered"
+        )
+    await db.refresh(db_user)
+    identifier_index.add(db_user.email, db_user.phone)
     
     # Handle profile image upload
     if profile_image:
         try:
-            image_path = await save_uploaded_file(profile_image, db_user.id)
+            image_path = await save_uploaded_file(profile_image)
             db_user.profile_image = image_path
-            db.commit()
-            db.refresh(db_user)
+            async with write_lock():
+                await db.commit()
+            await db.refresh(db_user)
+            # Thumbnails and WebP variants are rendered after the response
+            background_tasks.add_task(process_profile_image, db_user.id, image_path)
         except Exception as e:
             # If image upload fails, user is still created
             pass
     
+    notify_user_changes()
+    stick_to_primary(response)
     return db_user
 
+@router.get("/availability", response_model=AvailabilityResponse)
+async def check_availability(
+    email: Optional[str] = Query(None, description="Email to check"),
+    phone: Optional[str] = Query(None, description="Phone number to check"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Check whether an email and/or phone number can still be registered
+    
+    Answered from the in-memory identifier filter; the database is only
+    queried for values that may already be registered.
+    """
+    if email is None and phone is None:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Provide email and/or phone"
+        )
+    
+    result = AvailabilityResponse()
+    if email is not None:
+        try:
+            # Normalized the same way as on registration
+            email = email_adapter.validate_python(email)
+        except ValidationError:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Invalid email address"
+            )
+        result.email_available = not (
+            identifier_index.might_exist("email", email)
+            and await db.scalar(select(User.id).where(User.email == email))
+        )
+    if phone is not None:
+        if not phone.isdigit():
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Phone must contain only digits"
+            )
+        result.phone_available = not (
+            identifier_index.might_exist("phone", phone)
+            and await db.scalar(select(User.id).where(User.phone == phone))
+        )
+    return result
+
 @router.post("/login", response_model=TokenResponse)
 async def login(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Login user with email/phone and password - Supports both OAuth2 form and JSON
     
@@ -204,10 +241,10 @@ async def login(
         )
     
     # Find user by email or phone
-    user = db.query(User).filter(
+    user = await db.scalar(select(User).where(
         (User.email == email_or_phone) |
         (User.phone == email_or_phone)
-    ).first()
+    ))
     
     if not user:
         raise HTTPException(
@@ -216,15 +253,15 @@ async def login(
         )
     
     # Verify password
-    if not verify_password(password, user.password):
+    if not await verify_password_async(password, user.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email/phone or password"
         )
     
-    # Create tokens (sub must be string for python-jose)
-    access_token = create_access_token(data={"sub": str(user.id)})
-    refresh_token = create_refresh_token(data={"sub": str(user.id)})
+    # Create tokens carrying the role and token version claims
+    access_token = create_access_token(data=user_token_claims(user))
+    refresh_token = create_refresh_token(data=user_token_claims(user))
     
     return {
         "access_token": access_token,
@@ -235,7 +272,7 @@ async def login(
 @router.post("/refresh", response_model=TokenResponse)
 async def refresh_token(
     refresh_data: RefreshToken,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Refresh access token using refresh token"""
     # Verify refresh token
@@ -255,7 +292,7 @@ async def refresh_token(
         )
     # Convert string back to int (python-jose requires sub to be string)
     user_id = int(user_id_str)
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
     
     if not user:
         raise HTTPException(
@@ -263,11 +300,18 @@ async def refresh_token(
             detail="User not found"
         )
     
-    # Create new access token (sub must be string for python-jose)
-    access_token = create_access_token(data={"sub": str(user.id)})
+    # Refresh tokens issued before a role change are revoked
+    if payload.get("ver", user.token_version) != user.token_version:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked"
+        )
+    
+    # Create new access token with the current role and token version
+    access_token = create_access_token(data=user_token_claims(user))
 
     # Optionally create new refresh token (refresh token rotation)
-    refresh_token = create_refresh_token(data={"sub": str(user.id)})
+    refresh_token = create_refresh_token(data=user_token_claims(user))
     
     return {
         "access_token": access_token,
@@ -277,8 +321,19 @@ async def refresh_token(
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Comma-separated user fields to return, e.g. id,name,profile_image"),
     current_user: User = Depends(get_current_user)
 ):
-    """Get current authenticated user information"""
+    """Get current authenticated user information (supports If-None-Match / If-Modified-Since)"""
+    field_names = parse_fields(fields)
+    etag, modified = user_validators(current_user.id, current_user.created_at, current_user.updated_at, field_names)
+    if is_not_modified(request, etag, modified):
+        return not_modified_response(etag, modified)
+    validators = validator_headers(etag, modified)
+    if field_names:
+        return sparse_response(sparse_user_model(field_names), current_user, headers=validators)
+    response.headers.update(validators)
     return current_user
 
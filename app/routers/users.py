@@ -1,100 +1,700 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Form, Request
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query, UploadFile, File, Form, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import String, delete, func, insert, select, text, tuple_, type_coerce, update
+from sqlalchemy.exc import IntegrityError
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from math import ceil
-from app.database import get_db
-from app.models import User
-from app.schemas import UserResponse, UserUpdate, PaginatedResponse
-from app.auth import get_current_user, get_current_admin_user
+from datetime import datetime
+from app.database import IS_SQLITE, AsyncReadSessionLocal, get_db, get_read_db, write_lock, stick_to_primary
+from app.models import User, UserRole
+from app.schemas import (
+    UserRegister, UserResponse, UserUpdate, PaginatedResponse, ImportResult,
+    BulkSelection, BulkUpdateRequest, BulkResult, UserStats, BatchUsersRequest, BatchUsersResponse, ChangeFeed,
+    DirectUploadTicket, DirectUploadComplete, EventsTicket,
+)
+from app.hashing import hash_passwords_async
+from app.auth import (
+    EVENTS_TICKET_EXPIRE_SECONDS, Principal, create_events_ticket, get_current_principal,
+    get_current_admin_principal, get_stream_admin_principal, get_detached_admin_principal, invalidate_principal,
+)
+from app.cache import count_cache
+from app.events import event_stream, notify_user_changes
+from app.search import apply_search
+from app.stats import get_stats
+from app.changes import CHANGE_FEED_MAX_LIMIT, record_changes, change_head, read_changes
+from app.uploads import save_uploaded_file, create_direct_upload, finalize_direct_upload
+from app.images import process_profile_image
+from app.blobs import release_images
+from app.identifiers import identifier_index
+from app.fieldsets import (
+    parse_fields, user_columns, sparse_user_model, sparse_page_model, sparse_batch_model, sparse_response,
+)
+from app.conditional import (
+    make_etag, user_validators, validator_headers, is_not_modified, has_conditional_headers,
+    not_modified_response, user_stamps, listing_version,
+)
+import base64
+import codecs
+import csv
+import enum
+import io
+import json
 import os
-import aiofiles
 
 router = APIRouter()
 
-ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png"}
-MAX_FILE_SIZE = 2 * 1024 * 1024  # 2MB
+# Keyset ordering column. SQLite stores timestamps as text, so compare the
+# stored text directly (still index-backed) instead of re-formatted datetimes.
+CREATED_AT_KEY = type_coerce(User.created_at, String) if IS_SQLITE else User.created_at
 
-async def save_uploaded_file(file: UploadFile, user_id: int) -> str:
-    """Save uploaded file and return the file path"""
-    file_ext = os.path.splitext(file.filename)[1].lower()
-    if file_ext not in ALLOWED_EXTENSIONS:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Only JPG and PNG files are allowed"
-        )
-    
-    content = await file.read()
-    if len(content) > MAX_FILE_SIZE:
+def encode_cursor(position) -> str:
+    """Encode a page position as an opaque cursor.
+
+    Keyset pages use [created_at, id] of the last row; ranked search pages
+    use {"offset": n} because rank order has no stable keyset.
+    """
+    if isinstance(position, list) and isinstance(position[0], datetime):
+        position = [position[0].isoformat(), position[1]]
+    raw = json.dumps(position).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_position(cursor: str):
+    """Decode an opaque cursor or checkpoint token back into its position"""
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    return json.loads(raw)
+
+def decode_cursor(cursor: str, ranked: bool = False):
+    """Decode a cursor into (created_at, id) bind values, or an offset for ranked search"""
+    try:
+        position = decode_position(cursor)
+        if ranked:
+            return int(position["offset"])
+        created_at, user_id = position
+        if not IS_SQLITE:
+            created_at = datetime.fromisoformat(created_at)
+        return created_at, int(user_id)
+    except (ValueError, TypeError, KeyError):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="File size must be less than 2MB"
+            detail="Invalid cursor"
         )
+
+# Columns written by GET /api/users/export (same fields as UserResponse)
+EXPORT_FIELDS = [field for field in UserResponse.model_fields if field != "profile_image_variants"]  # variants are derived files
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# Maximum ids per GET/POST /api/users/batch request
+BATCH_MAX_IDS = int(os.getenv("BATCH_MAX_IDS", "500"))
+
+# Bulk import settings
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))  # errors listed in the response
+
+def filter_users(query, search: Optional[str], state: Optional[str], city: Optional[str]):
+    """Apply the user listing filters; return (query, search rank expression or None)"""
+    # Apply search filter (served by the search index and ranked when available)
+    rank = None
+    if search:
+        query, rank = apply_search(query, search)
     
-    filename = f"user_{user_id}_{file.filename}"
-    filepath = os.path.join("uploads", filename)
+    # Apply state filter
+    if state:
+        query = query.where(User.state.ilike(f"%{state}%"))
     
-    async with aiofiles.open(filepath, 'wb') as f:
-        await f.write(content)
+    # Apply city filter
+    if city:
+        query = query.where(User.city.ilike(f"%{city}%"))
     
-    return f"/uploads/{filename}"
+    return query, rank
+
+async def count_users(db: AsyncSession, query, filters: tuple, mode: str, version: str) -> Optional[int]:
+    """Total rows matching query: "exact", "estimate" (may be stale) or "none" (skipped)
+
+    version is the current listing version; exact totals cached at another version are recomputed.
+    """
+    if mode == "none":
+        return None
+    cached = count_cache.get(filters)
+    if cached is not None:
+        cached_version, total = cached
+        if mode == "estimate" or cached_version == version:
+            return total
+    if mode == "estimate" and not any(filters) and not IS_SQLITE:
+        # PostgreSQL planner statistics (-1 until the table has been analyzed)
+        total = await db.scalar(text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'users'"))
+        if total is not None and total >= 0:
+            return total
+    total = await db.scalar(select(func.count()).select_from(query.subquery()))
+    count_cache.set(filters, (version, total))
+    return total
 
 @router.get("", response_model=PaginatedResponse)
 async def get_users(
+    request: Request,
+    response: Response,
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(10, ge=1, le=100, description="Items per page"),
     search: Optional[str] = Query(None, description="Search by name, email, state, or city"),
     state: Optional[str] = Query(None, description="Filter by state"),
     city: Optional[str] = Query(None, description="Filter by city"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    cursor: Optional[str] = Query(None, description="Opaque cursor from next_cursor (keyset pagination, ignores page)"),
+    count: str = Query("exact", pattern="^(exact|estimate|none)$", description="Total count: exact, estimate (cached, may be stale) or none"),
+    fields: Optional[str] = Query(None, description="Comma-separated user fields to return, e.g. id,name,profile_image"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_admin_principal)
 ):
-    """Get all users with pagination and filtering (Admin only)"""
-    query = db.query(User)
+    """Get all users with pagination and filtering (Admin only)
+
+    Results are ordered by (created_at, id), or by relevance when searching.
+    Pass the returned next_cursor as cursor to fetch the following page
+    without an OFFSET scan. Pass fields to select and return only those
+    user columns. Pages carry an ETag from the listing version, so
+    If-None-Match returns 304 without running the page query.
+    """
+    field_names = parse_fields(fields)
     
-    # Apply search filter
-    if search:
-        query = query.filter(
-            or_(
-                User.name.ilike(f"%{search}%"),
-                User.email.ilike(f"%{search}%"),
-                User.state.ilike(f"%{search}%"),
-                User.city.ilike(f"%{search}%")
-            )
-        )
+    # ETag from the listing version and the full query string
+    version = await listing_version(db)
+    etag = make_etag("users", version, request.url.query)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
     
-    # Apply state filter
-    if state:
-        query = query.filter(User.state.ilike(f"%{state}%"))
+    columns = [User] if field_names is None else user_columns(field_names)
+    query, rank = filter_users(select(*columns), search, state, city)
     
-    # Apply city filter
-    if city:
-        query = query.filter(User.city.ilike(f"%{city}%"))
+    # Get total count (cached per filter set; only case is normalized, as the filters ignore it)
+    filters = tuple((value or "").lower() for value in (search, state, city))
+    total = await count_users(db, query, filters, count, version)
     
-    # Get total count
-    total = query.count()
+    # Apply ordering and pagination (keyset when a cursor is given, offset otherwise)
+    query = query.add_columns(CREATED_AT_KEY.label("cursor_created_at"))
+    if rank is not None:
+        offset = decode_cursor(cursor, ranked=True) if cursor else (page - 1) * page_size
+        query = query.order_by(rank, CREATED_AT_KEY, User.id).offset(offset)
+    else:
+        query = query.order_by(CREATED_AT_KEY, User.id)
+        if cursor:
+            after_created_at, after_id = decode_cursor(cursor)
+            query = query.where(tuple_(CREATED_AT_KEY, User.id) > tuple_(after_created_at, after_id))
+        else:
+            query = query.offset((page - 1) * page_size)
+    rows = (await db.execute(query.limit(page_size + 1))).all()
     
-    # Apply pagination
-    skip = (page - 1) * page_size
-    users = query.offset(skip).limit(page_size).all()
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        if rank is not None:
+            next_cursor = encode_cursor({"offset": offset + page_size})
+        else:
+            last_id = rows[-1].id if field_names else rows[-1].User.id
+            next_cursor = encode_cursor([rows[-1].cursor_created_at, last_id])
     
-    total_pages = ceil(total / page_size) if total > 0 else 0
+    total_pages = None if total is None else ceil(total / page_size)
     
-    return {
+    result = {
         "total": total,
         "page": page,
         "page_size": page_size,
         "total_pages": total_pages,
-        "data": users
+        "next_cursor": next_cursor,
+        "data": rows if field_names else [row.User for row in rows]
     }
+    if field_names:
+        return sparse_response(sparse_page_model(field_names), result, headers=validator_headers(etag))
+    response.headers.update(validator_headers(etag))
+    return result
+
+@router.get("/stats", response_model=UserStats)
+async def get_user_stats(
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_principal)
+):
+    """User totals by role, country, state and city, plus signups per day (Admin only)
+
+    Served from a summary table that is recomputed only after users change.
+    """
+    return await get_stats(db)
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+async def _export_rows(query, export_format: str):
+    """Stream the query result as NDJSON lines or CSV rows, one batch at a time"""
+    async with AsyncReadSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_FIELDS)
+            yield buffer.getvalue()
+        async for batch in result.partitions():
+            if export_format == "csv":
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows([_export_value(value) for value in row] for row in batch)
+                yield buffer.getvalue()
+            else:
+                yield "".join(
+                    json.dumps({field: _export_value(value) for field, value in zip(EXPORT_FIELDS, row)}) + "\n"
+                    for row in batch
+                )
+
+@router.get("/export")
+async def export_users(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Export format: ndjson or csv"),
+    search: Optional[str] = Query(None, description="Search by name, email, state, or city"),
+    state: Optional[str] = Query(None, description="Filter by state"),
+    city: Optional[str] = Query(None, description="Filter by city"),
+    current_user: Principal = Depends(get_detached_admin_principal)
+):
+    """Stream all users matching the filters as NDJSON or CSV (Admin only)
+
+    Rows are read from a server-side cursor in batches, so memory use does
+    not grow with the size of the table.
+    """
+    query, _ = filter_users(select(*(getattr(User, field) for field in EXPORT_FIELDS)), search, state, city)
+    query = query.order_by(CREATED_AT_KEY, User.id)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    
+    # Checkpoint read before the export starts: a mirror resumes the change feed from here
+    async with AsyncReadSessionLocal() as db:
+        changes_since = encode_cursor({"seq": await change_head(db)})
+    return StreamingResponse(
+        _export_rows(query, format),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="users.{format}"',
+            "X-Changes-Since": changes_since,
+        },
+    )
+
+@router.post("/events/ticket", response_model=EventsTicket)
+async def create_user_events_ticket(
+    current_user: Principal = Depends(get_current_admin_principal)
+):
+    """Issue a short-lived ticket for the user event stream (Admin only)
+
+    EventSource cannot send an Authorization header, so the stream takes
+    this ticket as ?ticket= instead of the access token, which would
+    otherwise end up in access logs.
+    """
+    return {"ticket": create_events_ticket(current_user), "expires_in": EVENTS_TICKET_EXPIRE_SECONDS}
+
+@router.get("/events")
+async def user_events(
+    request: Request,
+    current_user: Principal = Depends(get_stream_admin_principal)
+):
+    """Server-Sent Events stream of user changes and dashboard stats (Admin only)
+
+    Sends a stats event on connect and whenever the stats summary is
+    refreshed, and a created, updated or deleted event (id = change seq)
+    for every user change on any worker. EventSource clients pass a ticket
+    from POST /events/ticket as ?ticket=; reconnects resume after
+    Last-Event-ID while the ticket is valid.
+    """
+    last_event_id = request.headers.get("last-event-id")
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    return StreamingResponse(
+        event_stream(last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/changes", response_model=ChangeFeed)
+async def get_user_changes(
+    since: Optional[str] = Query(None, description="Checkpoint token (next_since of the previous call, or X-Changes-Since of an export); omit to start from the beginning"),
+    limit: int = Query(100, ge=1, description="Maximum changes to return"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_admin_principal)
+):
+    """Users created, updated and deleted since a checkpoint, in commit order (Admin only)
+
+    Each change carries the user's current state (null for deletions).
+    Pass next_since back as since to resume; keep reading while has_more
+    is true.
+    """
+    since_seq = 0
+    if since:
+        try:
+            since_seq = int(decode_position(since)["seq"])
+        except (ValueError, TypeError, KeyError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid checkpoint token"
+            )
+    
+    entries, users, has_more = await read_changes(db, since_seq, min(limit, CHANGE_FEED_MAX_LIMIT))
+    return {
+        "changes": [
+            {
+                "seq": entry.seq,
+                "op": entry.op,
+                "user_id": entry.user_id,
+                "changed_at": entry.changed_at,
+                "user": users.get(entry.user_id) if entry.op != "deleted" else None,
+            }
+            for entry in entries
+        ],
+        "next_since": encode_cursor({"seq": entries[-1].seq if entries else since_seq}),
+        "has_more": has_more,
+    }
+
+async def _iter_lines(request: Request):
+    """Yield decoded lines of the request body as it streams in (line endings kept)"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in request.stream():
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+async def _iter_csv_records(request: Request):
+    """Yield parsed CSV records, joining lines while a quoted field (which may span lines) is open"""
+    record = ""
+    async for line in _iter_lines(request):
+        record += line
+        # Escaped quotes come in pairs, so an odd count means a field is still open
+        if record.count('"') % 2:
+            continue
+        if record.strip():
+            yield next(csv.reader([record]))
+        record = ""
+    if record.strip():
+        yield next(csv.reader([record]))
+
+async def _iter_import_rows(request: Request, import_format: str):
+    """Yield (row number, dict or parse error message) for each data row"""
+    row_number = 0
+    if import_format == "csv":
+        header = None
+        async for values in _iter_csv_records(request):
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            row_number += 1
+            yield row_number, {name: value.strip() or None for name, value in zip(header, values)}
+        return
+    async for line in _iter_lines(request):
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield row_number, f"Invalid JSON: {e}"
+            continue
+        yield row_number, row if isinstance(row, dict) else "Each line must be a JSON object"
+
+async def _import_batch(db: AsyncSession, batch: list, seen_emails: set, seen_phones: set, errors: list) -> int:
+    """Validate, de-duplicate, hash and insert one batch of (row number, UserRegister); return rows inserted"""
+    # Only values the identifier filter cannot rule out are looked up
+    emails = [user_data.email for _, user_data in batch if identifier_index.might_exist("email", user_data.email)]
+    phones = [user_data.phone for _, user_data in batch if identifier_index.might_exist("phone", user_data.phone)]
+    taken_emails = set((await db.scalars(select(User.email).where(User.email.in_(emails)))).all()) if emails else set()
+    taken_phones = set((await db.scalars(select(User.phone).where(User.phone.in_(phones)))).all()) if phones else set()
+    
+    accepted = []
+    for row_number, user_data in batch:
+        if user_data.email in taken_emails or user_data.email in seen_emails:
+            errors.append({"row": row_number, "error": "Email already registered"})
+        elif user_data.phone in taken_phones or user_data.phone in seen_phones:
+            errors.append({"row": row_number, "error": "Phone number already registered"})
+        else:
+            seen_emails.add(user_data.email)
+            seen_phones.add(user_data.phone)
+            accepted.append((row_number, user_data))
+    if not accepted:
+        return 0
+    
+    # Hash passwords in parallel across the hashing executor
+    hashed_passwords = await hash_passwords_async([user_data.password for _, user_data in accepted])
+    values = [
+        {
+            "name": user_data.name,
+            "email": user_data.email,
+            "phone": user_data.phone,
+            "password": hashed_password,
+            "address": user_data.address,
+            "state": user_data.state,
+            "city": user_data.city,
+            "country": user_data.country,
+            "pincode": user_data.pincode,
+            "role": UserRole.USER,
+        }
+        for (_, user_data), hashed_password in zip(accepted, hashed_passwords)
+    ]
+    
+    # Insert the batch in one transaction
+    try:
+        async with write_lock():
+            user_ids = (await db.scalars(insert(User).returning(User.id), values)).all()
+            await record_changes(db, "created", user_ids)
+            await db.commit()
+        for row_values in values:
+            identifier_index.add(row_values["email"], row_values["phone"])
+        return len(values)
+    except IntegrityError:
+        await db.rollback()
+    
+    # A concurrent registration took an email/phone: insert row by row to find it
+    inserted = 0
+    for (row_number, _), row_values in zip(accepted, values):
+        try:
+            async with write_lock():
+                user_id = await db.scalar(insert(User).values(row_values).returning(User.id))
+                await record_changes(db, "created", [user_id])
+                await db.commit()
+            identifier_index.add(row_values["email"], row_values["phone"])
+            inserted += 1
+        except IntegrityError:
+            await db.rollback()
+            errors.append({"row": row_number, "error": "Email or phone number already registered"})
+    return inserted
+
+@router.post("/import", response_model=ImportResult)
+async def import_users(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Body format: ndjson or csv (with header row)"),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_principal)
+):
+    """Bulk-register users from an NDJSON or CSV body (Admin only)
+
+    Each row is validated like POST /api/auth/register. Uniqueness is
+    checked per batch with set-based queries, passwords are hashed in
+    parallel, and each batch is inserted in its own transaction. Rows that
+    fail are reported with their row number and do not stop the import.
+    """
+    errors = []
+    total_rows = imported = 0
+    seen_emails, seen_phones = set(), set()
+    batch = []
+    async for row_number, row in _iter_import_rows(request, format):
+        total_rows = row_number
+        if isinstance(row, str):
+            errors.append({"row": row_number, "error": row})
+            continue
+        try:
+            batch.append((row_number, UserRegister(**row)))
+        except ValidationError as e:
+            errors.append({"row": row_number, "error": "; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+            )})
+            continue
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            imported += await _import_batch(db, batch, seen_emails, seen_phones, errors)
+            batch = []
+    if batch:
+        imported += await _import_batch(db, batch, seen_emails, seen_phones, errors)
+    
+    if imported:
+        notify_user_changes()
+    errors.sort(key=lambda error: error["row"])
+    return {
+        "total_rows": total_rows,
+        "imported": imported,
+        "failed": total_rows - imported,
+        "errors": errors[:IMPORT_MAX_ERRORS],
+    }
+
+def select_bulk_ids(selection: BulkSelection):
+    """Query for the ids of users matching the bulk selection (ids and/or filter)"""
+    search = state = city = None
+    if selection.filter:
+        search, state, city = selection.filter.search, selection.filter.state, selection.filter.city
+    if not selection.ids and not (search or state or city):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide ids or a non-empty filter"
+        )
+    query, _ = filter_users(select(User.id), search, state, city)
+    if selection.ids:
+        query = query.where(User.id.in_(selection.ids))
+    return query
+
+@router.patch("/bulk", response_model=BulkResult)
+async def bulk_update_users(
+    payload: BulkUpdateRequest,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_principal)
+):
+    """Apply the same field updates to many users (Admin only)
+
+    Users are selected by ids and/or the GET /api/users filters, and are
+    updated with a single UPDATE statement in one transaction.
+    """
+    update_data = payload.update.dict(exclude_unset=True, exclude_none=True)
+    if not update_data:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No fields to update"
+        )
+    if "email" in update_data or "phone" in update_data:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email and phone number are unique and cannot be bulk updated"
+        )
+    
+    statement = (
+        update(User)
+        .where(User.id.in_(select_bulk_ids(payload)))
+        .values(**update_data)
+        .returning(User.id)
+        .execution_options(synchronize_session=False)
+    )
+    async with write_lock():
+        user_ids = list((await db.scalars(statement)).all())
+        await record_changes(db, "updated", user_ids)
+        await db.commit()
+    for user_id in user_ids:
+        invalidate_principal(user_id)
+    if user_ids:
+        notify_user_changes()
+    stick_to_primary(response)
+    
+    return {"affected": len(user_ids), "ids": user_ids}
+
+@router.post("/bulk-delete", response_model=BulkResult)
+async def bulk_delete_users(
+    selection: BulkSelection,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_principal)
+):
+    """Delete many users (Admin only)
+
+    Users are selected by ids and/or the GET /api/users filters, and are
+    deleted with a single DELETE statement in one transaction. The calling
+    admin is never deleted. Their profile images are released to the
+    image garbage collector.
+    """
+    # Prevent admin from deleting themselves
+    if selection.ids and current_user.id in selection.ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cannot delete your own account"
+        )
+    
+    statement = (
+        delete(User)
+        .where(User.id.in_(select_bulk_ids(selection).where(User.id != current_user.id)))
+        .returning(User.id, User.profile_image)
+        .execution_options(synchronize_session=False)
+    )
+    async with write_lock():
+        rows = (await db.execute(statement)).all()
+        await record_changes(db, "deleted", [row.id for row in rows])
+        await release_images(db, [row.profile_image for row in rows])
+        await db.commit()
+    user_ids = [row.id for row in rows]
+    for user_id in user_ids:
+        invalidate_principal(user_id)
+    if user_ids:
+        notify_user_changes()
+    stick_to_primary(response)
+    
+    return {"affected": len(user_ids), "ids": user_ids}
+
+async def fetch_user_batch(ids: list, fields: Optional[str], db: AsyncSession, current_user: Principal):
+    """Resolve ids with one IN query, keeping the request order (null for missing or forbidden ids)"""
+    if len(ids) > BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {BATCH_MAX_IDS} ids per request"
+        )
+    field_names = parse_fields(fields)
+    unique_ids = list(dict.fromkeys(ids))
+    
+    # Users can only view their own profile unless they are admin
+    if current_user.role.value == "admin":
+        allowed, forbidden = unique_ids, []
+    else:
+        allowed = [user_id for user_id in unique_ids if user_id == current_user.id]
+        forbidden = [user_id for user_id in unique_ids if user_id != current_user.id]
+    
+    found = {}
+    if allowed:
+        if field_names is None:
+            found = {user.id: user for user in await db.scalars(select(User).where(User.id.in_(allowed)))}
+        else:
+            result = await db.execute(select(*user_columns(field_names)).where(User.id.in_(allowed)))
+            found = {row.id: row for row in result}
+    
+    batch = {
+        "data": [found.get(user_id) for user_id in ids],
+        "missing": [user_id for user_id in allowed if user_id not in found],
+        "forbidden": forbidden,
+    }
+    if field_names:
+        return sparse_response(sparse_batch_model(field_names), batch)
+    return batch
+
+@router.get("/batch", response_model=BatchUsersResponse)
+async def get_users_batch(
+    ids: str = Query(..., description="Comma-separated user ids, e.g. 1,2,3"),
+    fields: Optional[str] = Query(None, description="Comma-separated user fields to return, e.g. id,name,profile_image"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """Get several users by ID in one request
+
+    Results keep the order of ids. Ids that do not exist, or that the
+    caller may not view, are returned as null and listed in missing or
+    forbidden.
+    """
+    try:
+        user_ids = [int(user_id) for user_id in ids.split(",") if user_id.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids must be a comma-separated list of integers"
+        )
+    if not user_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids must not be empty"
+        )
+    return await fetch_user_batch(user_ids, fields, db, current_user)
+
+@router.post("/batch", response_model=BatchUsersResponse)
+async def post_users_batch(
+    payload: BatchUsersRequest,
+    fields: Optional[str] = Query(None, description="Comma-separated user fields to return, e.g. id,name,profile_image"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """Get several users by ID, with the ids in the request body (for long lists)"""
+    return await fetch_user_batch(payload.ids, fields, db, current_user)
 
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Comma-separated user fields to return, e.g. id,name,profile_image"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
-    """Get a single user by ID"""
+    """Get a single user by ID
+
+    Supports If-None-Match / If-Modified-Since: the check reads only the
+    user's timestamps and returns 304 when the profile has not changed.
+    """
     # Users can only view their own profile unless they are admin
     if current_user.role.value != "admin" and current_user.id != user_id:
         raise HTTPException(
@@ -102,19 +702,43 @@ async def get_user(
             detail="Not enough permissions"
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
+    field_names = parse_fields(fields)
+    
+    # Answer conditional requests from the timestamps alone
+    if has_conditional_headers(request):
+        stamps = await user_stamps(db, user_id)
+        if stamps:
+            etag, modified = user_validators(user_id, *stamps, field_names)
+            if is_not_modified(request, etag, modified):
+                return not_modified_response(etag, modified)
+    
+    if field_names is None:
+        user = await db.scalar(select(User).where(User.id == user_id))
+        stamps = (user.created_at, user.updated_at) if user else None
+    else:
+        user = (await db.execute(
+            select(*user_columns(field_names), User.created_at.label("stamp_created_at"), User.updated_at.label("stamp_updated_at"))
+            .where(User.id == user_id)
+        )).first()
+        stamps = (user.stamp_created_at, user.stamp_updated_at) if user else None
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
+    validators = validator_headers(*user_validators(user_id, *stamps, field_names))
+    if field_names:
+        return sparse_response(sparse_user_model(field_names), user, headers=validators)
+    response.headers.update(validators)
     return user
 
 @router.put("/{user_id}", response_model=UserResponse)
 async def update_user(
     user_id: int,
     request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
     name: Optional[str] = Form(None),
     email: Optional[str] = Form(None),
     phone: Optional[str] = Form(None),
@@ -124,8 +748,8 @@ async def update_user(
     country: Optional[str] = Form(None),
     pincode: Optional[str] = Form(None),
     profile_image: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Update a user (Users can update their own profile, Admins can update any)
     Supports both form data (for file uploads) and JSON (for API calls without files)
@@ -138,7 +762,7 @@ async def update_user(
             detail="Not enough permissions"
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -178,8 +802,9 @@ async def update_user(
     
     # Check email uniqueness if updating email
     if "email" in update_data and update_data["email"] != user.email:
-        existing_user = db.query(User).filter(User.email == update_data["email"]).first()
-        if existing_user:
+        if identifier_index.might_exist("email", update_data["email"]) and await db.scalar(
+            select(User.id).where(User.email == update_data["email"])
+        ):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
@@ -187,13 +812,18 @@ async def update_user(
     
     # Check phone uniqueness if updating phone
     if "phone" in update_data and update_data["phone"] != user.phone:
-        existing_phone = db.query(User).filter(User.phone == update_data["phone"]).first()
-        if existing_phone:
+        if identifier_index.might_exist("phone", update_data["phone"]) and await db.scalar(
+            select(User.id).where(User.phone == update_data["phone"])
+        ):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Phone number already registered"
             )
     
+    replaced_identifiers = sum(
+        1 for field in ("email", "phone") if field in update_data and update_data[field] != getattr(user, field)
+    )
+    
     # Update user fields
     for field, value in update_data.items():
         setattr(user, field, value)
@@ -201,33 +831,52 @@ async def update_user(
     # Handle profile image upload
     if profile_image:
         try:
-            # Delete old image if exists
-            if user.profile_image:
-                old_path = user.profile_image.lstrip("/")
-                if os.path.exists(old_path):
-                    os.remove(old_path)
-            
-            image_path = await save_uploaded_file(profile_image, user.id)
-            user.profile_image = image_path
+            # Save first so a rejected upload keeps the current image
+            # The old image is released to the image garbage collector on commit
+            image_path = await save_uploaded_file(profile_image)
+            if image_path != user.profile_image:
+                user.profile_image = image_path
+                user.profile_image_variants = None
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Error uploading image: {str(e)}"
             )
     
-    db.commit()
-    db.refresh(user)
+    try:
+        async with write_lock():
+            await db.commit()
+    except IntegrityError:
+        # Taken concurrently (possibly on another worker) since the checks above
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email or phone number already registered"
+        )
+    await db.refresh(user)
+    if replaced_identifiers:
+        identifier_index.add(user.email, user.phone)
+        identifier_index.discard(replaced_identifiers)
+    invalidate_principal(user.id)
+    notify_user_changes()
+    stick_to_primary(response)
+    if profile_image:
+        # Thumbnails and WebP variants are rendered after the response
+        background_tasks.add_task(process_profile_image, user.id, user.profile_image)
     
     return user
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_principal)
 ):
     """Delete a user (Admin only)"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -241,14 +890,68 @@ async def delete_user(
             detail="Cannot delete your own account"
         )
     
-    # Delete profile image if exists
-    if user.profile_image:
-        image_path = user.profile_image.lstrip("/")
-        if os.path.exists(image_path):
-            os.remove(image_path)
-    
-    db.delete(user)
-    db.commit()
+    # The profile image is released to the image garbage collector on commit
+    await db.delete(user)
+    async with write_lock():
+        await db.commit()
+    invalidate_principal(user_id)
+    notify_user_changes()
+    stick_to_primary(response)
     
     return None
 
+@router.post("/{user_id}/profile-image/upload-url", response_model=DirectUploadTicket)
+async def create_profile_image_upload(
+    user_id: int,
+    current_user: Principal = Depends(get_current_principal)
+):
+    """Presigned URL for uploading a profile image straight to object storage
+
+    The client POSTs the file to the returned URL, then calls
+    POST /api/users/{user_id}/profile-image with the upload_id.
+    """
+    if current_user.role.value != "admin" and current_user.id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    return await create_direct_upload(user_id)
+
+@router.post("/{user_id}/profile-image", response_model=UserResponse)
+async def complete_profile_image_upload(
+    user_id: int,
+    upload: DirectUploadComplete,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """Set the profile image to a direct upload, after checking its type and size"""
+    if current_user.role.value != "admin" and current_user.id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    user = await db.scalar(select(User).where(User.id == user_id))
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    
+    # The old image is released to the image garbage collector on commit
+    image_path = await finalize_direct_upload(user_id, upload.upload_id)
+    if image_path != user.profile_image:
+        user.profile_image = image_path
+        user.profile_image_variants = None
+    
+    async with write_lock():
+        await db.commit()
+    await db.refresh(user)
+    invalidate_principal(user.id)
+    notify_user_changes()
+    stick_to_primary(response)
+    background_tasks.add_task(process_profile_image, user.id, user.profile_image)
+    
+    return user
@@ -61,6 +61,11 @@ class TokenResponse(BaseModel):
 class RefreshToken(BaseModel):
     refresh_token: str
 
+# Events Ticket Schema (query credential for the user event stream)
+class EventsTicket(BaseModel):
+    ticket: str
+    expires_in: int  # seconds
+
 # User Response Schema (without sensitive data)
 class UserResponse(BaseModel):
     id: int
@@ -68,6 +73,7 @@ class UserResponse(BaseModel):
     email: str
     phone: str
     profile_image: Optional[str] = None
+    profile_image_variants: Optional[dict[str, str]] = None  # "64", "256" (square WebP thumbnails) and "webp"
     address: Optional[str] = None
     state: str
     city: str
@@ -117,9 +123,92 @@ class UserUpdate(BaseModel):
 
 # Pagination Schema
 class PaginatedResponse(BaseModel):
-    total: int
+    total: Optional[int] = None  # None when count=none
     page: int
     page_size: int
-    total_pages: int
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None  # Pass as cursor to fetch the next page
     data: list[UserResponse]
 
+
+# Bulk Import Schemas
+class ImportRowError(BaseModel):
+    row: int  # 1-based data row number (CSV header not counted)
+    error: str
+
+class ImportResult(BaseModel):
+    total_rows: int
+    imported: int
+    failed: int
+    errors: list[ImportRowError]
+
+
+# Bulk Update/Delete Schemas
+class UserFilter(BaseModel):
+    search: Optional[str] = None
+    state: Optional[str] = None
+    city: Optional[str] = None
+
+class BulkSelection(BaseModel):
+    ids: Optional[list[int]] = Field(None, min_length=1, max_length=10000)
+    filter: Optional[UserFilter] = None  # Same filters as GET /api/users; ANDed with ids
+
+class BulkUpdateRequest(BulkSelection):
+    update: UserUpdate
+
+class BulkResult(BaseModel):
+    affected: int  # Users updated or deleted
+    ids: list[int]
+
+
+# Dashboard Stats Schema
+class UserStats(BaseModel):
+    total: int
+    by_role: dict[str, int]
+    by_country: dict[str, int]  # Top values by count
+    by_state: dict[str, int]
+    by_city: dict[str, int]
+    signups_per_day: dict[str, int]  # YYYY-MM-DD, oldest first
+    refreshed_at: Optional[datetime] = None  # null until the summary is first computed
+
+
+# Batch Fetch Schemas
+class BatchUsersRequest(BaseModel):
+    ids: list[int] = Field(..., min_length=1)
+
+class BatchUsersResponse(BaseModel):
+    data: list[Optional[UserResponse]]  # In request order; null for missing or forbidden ids
+    missing: list[int]
+    forbidden: list[int]
+
+
+# Change Feed Schemas
+class UserChangeEntry(BaseModel):
+    seq: int
+    op: str  # created, updated or deleted
+    user_id: int
+    changed_at: Optional[datetime] = None
+    user: Optional[UserResponse] = None  # Current state; null once the user is deleted
+
+class ChangeFeed(BaseModel):
+    changes: list[UserChangeEntry]
+    next_since: str  # Checkpoint token: pass as since to resume after these changes
+    has_more: bool
+
+
+# Direct Upload Schemas
+class DirectUploadTicket(BaseModel):
+    upload_id: str  # Pass to POST /api/users/{id}/profile-image once the upload is done
+    url: str  # POST the file here as multipart/form-data ...
+    fields: dict[str, str]  # ... with these form fields first, then the file as "file"
+    max_size: int
+    expires_in: int  # Seconds
+
+class DirectUploadComplete(BaseModel):
+    upload_id: str
+
+
+# Availability Schemas
+class AvailabilityResponse(BaseModel):
+    email_available: Optional[bool] = None  # null when email was not asked about
+    phone_available: Optional[bool] = None
@@ -0,0 +1,101 @@
+"""
+User search index
+
+SQLite: an FTS5 table with the trigram tokenizer over name, email, state
+and city, kept in sync with the users table by triggers. Trigram matching
+keeps the substring semantics of the old ILIKE '%term%' search, but
+answers it from the index and ranks with bm25.
+
+PostgreSQL: pg_trgm GIN indexes on the same columns, which serve the
+ILIKE filters directly; results are ranked by trigram similarity.
+"""
+import logging
+from sqlalchemy import column, func, literal_column, or_, table
+from sqlalchemy.exc import DBAPIError
+from app.database import IS_SQLITE
+from app.models import User
+
+SEARCH_COLUMNS = ("name", "email", "state", "city")
+MIN_INDEXED_TERM_LENGTH = 3  # trigram indexes cannot answer shorter terms
+
+users_fts = table("users_fts", column("rowid"), column("rank"))
+
+# Set by ensure_search_index() once the index exists for this process
+search_index_enabled = False
+
+logger = logging.getLogger(__name__)
+
+_SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5("
+    "name, email, state, city, content='users', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN "
+    "INSERT INTO users_fts(rowid, name, email, state, city) "
+    "VALUES (new.id, new.name, new.email, new.state, new.city); END",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN "
+    "INSERT INTO users_fts(users_fts, rowid, name, email, state, city) "
+    "VALUES ('delete', old.id, old.name, old.email, old.state, old.city); END",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF name, email, state, city ON users BEGIN "
+    "INSERT INTO users_fts(users_fts, rowid, name, email, state, city) "
+    "VALUES ('delete', old.id, old.name, old.email, old.state, old.city); "
+    "INSERT INTO users_fts(rowid, name, email, state, city) "
+    "VALUES (new.id, new.name, new.email, new.state, new.city); END",
+]
+
+_POSTGRES_DDL = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"] + [
+    f"CREATE INDEX IF NOT EXISTS ix_users_{name}_trgm ON users USING gin ({name} gin_trgm_ops)"
+    for name in SEARCH_COLUMNS
+]
+
+def ensure_search_index(bind):
+    """Create the search index (and populate it on first creation)"""
+    global search_index_enabled
+    dialect = bind.dialect.name
+    try:
+        with bind.begin() as conn:
+            if dialect == "sqlite":
+                created = not conn.exec_driver_sql(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'users_fts'"
+                ).first()
+                for ddl in _SQLITE_DDL:
+                    conn.exec_driver_sql(ddl)
+                if created:
+                    conn.exec_driver_sql("INSERT INTO users_fts(users_fts) VALUES ('rebuild')")
+            elif dialect == "postgresql":
+                for ddl in _POSTGRES_DDL:
+                    conn.exec_driver_sql(ddl)
+            else:
+                return
+    except DBAPIError as e:
+        # SQLite built without FTS5 trigram support (< 3.34), or a PostgreSQL role that may not
+        # create the pg_trgm extension: keep ILIKE search
+        logger.warning("Search index unavailable, falling back to ILIKE search: %s", e.orig)
+        return
+    search_index_enabled = True
+
+def rebuild_search_index(bind):
+    """Rebuild the search index from the users table"""
+    ensure_search_index(bind)
+    if bind.dialect.name == "sqlite" and search_index_enabled:
+        with bind.begin() as conn:
+            conn.exec_driver_sql("INSERT INTO users_fts(users_fts) VALUES ('rebuild')")
+    elif bind.dialect.name == "postgresql" and search_index_enabled:
+        with bind.begin() as conn:
+            for name in SEARCH_COLUMNS:
+                conn.exec_driver_sql(f"REINDEX INDEX ix_users_{name}_trgm")
+
+def apply_search(query, term: str):
+    """Filter query by a search term; return (query, rank expression or None).
+
+    Lower rank values sort first.
+    """
+    ilike_filter = or_(*(getattr(User, name).ilike(f"%{term}%") for name in SEARCH_COLUMNS))
+    if not search_index_enabled or len(term) < MIN_INDEXED_TERM_LENGTH:
+        return query.where(ilike_filter), None
+    if IS_SQLITE:
+        phrase = '"' + term.replace('"', '""') + '"'
+        query = query.join(users_fts, users_fts.c.rowid == User.id).where(
+            literal_column("users_fts").op("MATCH")(phrase)
+        )
+        return query, users_fts.c.rank
+    similarity = func.greatest(*(func.similarity(getattr(User, name), term) for name in SEARCH_COLUMNS))
+    return query.where(ilike_filter), -similarity
@@ -0,0 +1,118 @@
+"""
+User statistics for the admin dashboard
+
+Counts by role, country, state, city and signup day are kept in the
+user_stats summary table. Reading the stats is one query over the summary
+rows, and requests never recompute it. A background task in each worker
+checks the summary every STATS_REFRESH_SECONDS and recomputes it with
+GROUP BY queries when the users table has changed (its listing version
+moved) and no other worker has refreshed it within that interval.
+"""
+from datetime import datetime, timedelta, timezone
+import asyncio
+import enum
+import logging
+import os
+from typing import Optional
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.conditional import as_utc, listing_version
+from app.database import AsyncSessionLocal, write_lock
+from app.models import User, UserStat
+
+# Stats settings (use environment variables)
+STATS_REFRESH_SECONDS = float(os.getenv("STATS_REFRESH_SECONDS", "10"))  # how often a stale summary is recomputed
+STATS_TOP_N = int(os.getenv("STATS_TOP_N", "20"))  # values listed per country/state/city
+STATS_SIGNUP_DAYS = int(os.getenv("STATS_SIGNUP_DAYS", "30"))
+
+DIMENSIONS = {"role": User.role, "country": User.country, "state": User.state, "city": User.city}
+
+logger = logging.getLogger(__name__)
+
+_task: Optional[asyncio.Task] = None
+
+def _stat_value(value) -> str:
+    return value.value if isinstance(value, enum.Enum) else str(value)
+
+async def refresh_stats(db: AsyncSession):
+    """Recompute the summary table from the users table"""
+    # Read the version first: writes that race with the GROUP BYs leave the summary stale, not wrong forever
+    version = await listing_version(db)
+    counts = [("total", "", await db.scalar(select(func.count()).select_from(User)))]
+    for dimension, column in DIMENSIONS.items():
+        result = await db.execute(select(column, func.count()).group_by(column))
+        counts += [(dimension, _stat_value(value), count) for value, count in result.all()]
+    signup_day = func.date(User.created_at)
+    result = await db.execute(select(signup_day, func.count()).where(User.created_at.isnot(None)).group_by(signup_day))
+    counts += [("signup_day", _stat_value(value), count) for value, count in result.all()]
+
+    refreshed_at = datetime.now(timezone.utc)
+    try:
+        async with write_lock():
+            await db.execute(delete(UserStat))
+            await db.execute(insert(UserStat), [
+                {"dimension": dimension, "value": value, "count": count, "version": version, "refreshed_at": refreshed_at}
+                for dimension, value, count in counts
+            ])
+            await db.commit()
+    except IntegrityError:
+        # Another worker refreshed the summary at the same time; keep its rows
+        await db.rollback()
+
+async def refresh_stats_if_stale(db: AsyncSession) -> bool:
+    """Recompute the summary if users changed since it was last refreshed; return whether it was"""
+    row = (await db.execute(select(UserStat.version, UserStat.refreshed_at).limit(1))).first()
+    if row is not None:
+        age = datetime.now(timezone.utc) - as_utc(row.refreshed_at)
+        if age.total_seconds() < STATS_REFRESH_SECONDS or row.version == await listing_version(db):
+            return False
+    await refresh_stats(db)
+    return True
+
+async def _run_stats_refresher():
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await refresh_stats_if_stale(db)
+        except Exception:
+            logger.exception("Stats refresh failed")
+        await asyncio.sleep(STATS_REFRESH_SECONDS)
+
+def start_stats_refresher():
+    """Start the periodic stats refresh (called on application startup)"""
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_run_stats_refresher())
+
+async def stop_stats_refresher():
+    """Cancel the stats refresh (called on application shutdown)"""
+    global _task
+    if _task is not None:
+        _task.cancel()
+        _task = None
+
+async def get_stats(db: AsyncSession) -> dict:
+    """Dashboard stats from the summary table (empty until its first refresh)"""
+    rows = (await db.execute(select(UserStat.__table__))).all()
+
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row.dimension, {})[row.value] = row.count
+
+    def top(dimension):
+        values = sorted(grouped.get(dimension, {}).items(), key=lambda item: (-item[1], item[0]))
+        return dict(values[:STATS_TOP_N])
+
+    first_day = (datetime.now(timezone.utc).date() - timedelta(days=STATS_SIGNUP_DAYS - 1)).isoformat()
+    return {
+        "total": grouped.get("total", {}).get("", 0),
+        "by_role": grouped.get("role", {}),
+        "by_country": top("country"),
+        "by_state": top("state"),
+        "by_city": top("city"),
+        "signups_per_day": dict(sorted(
+            (day, count) for day, count in grouped.get("signup_day", {}).items() if day >= first_day
+        )),
+        "refreshed_at": as_utc(rows[0].refreshed_at) if rows else None,
+    }
@@ -0,0 +1,228 @@
+"""
+Storage backends for uploaded images
+
+Images are addressed by a key relative to the uploads root (e.g.
+ab/ab12...ef.png); users.profile_image keeps the URL path /uploads/<key>.
+With STORAGE_BACKEND=local (default) files live in uploads/ and are served
+by the app. With STORAGE_BACKEND=s3 they live in an S3-compatible bucket
+(AWS, MinIO, ...): /uploads/<key> redirects to a presigned or public URL,
+and clients can upload directly to the bucket with a presigned POST, so
+image bytes do not pass through the app.
+"""
+import os
+import mimetypes
+from typing import Optional
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:  # Only needed for STORAGE_BACKEND=s3
+    boto3 = None
+
+# Storage settings (use environment variables)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")  # "local" or "s3"
+UPLOAD_URL_PREFIX = "/uploads/"
+S3_BUCKET = os.getenv("S3_BUCKET", "user-management-uploads")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # e.g. http://localhost:9000 for MinIO
+S3_PRESIGN_ENDPOINT_URL = os.getenv("S3_PRESIGN_ENDPOINT_URL") or S3_ENDPOINT_URL  # Endpoint as reached by browsers
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_PUBLIC_URL = os.getenv("S3_PUBLIC_URL")  # Public bucket or CDN base URL; presigned URLs otherwise
+S3_URL_EXPIRES_SECONDS = int(os.getenv("S3_URL_EXPIRES_SECONDS", "3600"))
+
+# Stored images never change (their key is their content hash)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Variants are rendered to fixed keys and may be re-rendered with new settings
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+def storage_key(image_path: str) -> str:
+    """Storage key for an image URL path (/uploads/<key>)"""
+    return image_path[len(UPLOAD_URL_PREFIX):] if image_path.startswith(UPLOAD_URL_PREFIX) else image_path.lstrip("/")
+
+def image_url(key: str) -> str:
+    """URL path stored in users.profile_image for a storage key"""
+    return UPLOAD_URL_PREFIX + key
+
+def content_type(key: str) -> str:
+    return mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+class LocalStorage:
+    """Images in a local directory, served by the app under /uploads"""
+
+    supports_direct_upload = False
+
+    def __init__(self, root: str = "uploads"):
+        self.root = root
+        # Temp files are created next to the images so the final rename is atomic
+        self.temp_dir = root
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def modified_at(self, key: str) -> Optional[float]:
+        """Last write as a Unix timestamp, or None if missing"""
+        try:
+            return os.stat(self.path(key)).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def touch(self, key: str):
+        os.utime(self.path(key))
+
+    def store_file(self, source_path: str, key: str):
+        """Move a local file to key"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(source_path, path)
+
+    def read_bytes(self, key: str) -> bytes:
+        with open(self.path(key), "rb") as f:
+            return f.read()
+
+    def write_bytes(self, key: str, data: bytes):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def delete(self, keys: list):
+        for key in keys:
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+class S3Storage:
+    """Images in an S3-compatible bucket, downloaded and uploaded by clients with presigned URLs"""
+
+    supports_direct_upload = True
+    temp_dir = None
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, region: str = "us-east-1",
+                 presign_endpoint_url: Optional[str] = None):
+        if boto3 is None:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 (pip install boto3)")
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self.presign_endpoint_url = presign_endpoint_url or endpoint_url
+        self.region = region
+        self._clients = {}
+        self._clients_pid = None
+
+    def _client_for(self, endpoint_url: Optional[str]):
+        # boto3 clients are not fork-safe: each process (e.g. image workers) builds its own
+        if self._clients_pid != os.getpid():
+            self._clients = {}
+            self._clients_pid = os.getpid()
+        if endpoint_url not in self._clients:
+            self._clients[endpoint_url] = boto3.client(
+                "s3", endpoint_url=endpoint_url, region_name=self.region,
+                config=BotoConfig(signature_version="s3v4", s3={"addressing_style": "path"}),
+            )
+        return self._clients[endpoint_url]
+
+    @property
+    def client(self):
+        return self._client_for(self.endpoint_url)
+
+    @property
+    def presign_client(self):
+        """Client that signs URLs for browsers (signing needs no network access)"""
+        return self._client_for(self.presign_endpoint_url)
+
+    def _head(self, key: str) -> Optional[dict]:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def exists(self, key: str) -> bool:
+        return self._head(key) is not None
+
+    def size(self, key: str) -> Optional[int]:
+        head = self._head(key)
+        return head["ContentLength"] if head else None
+
+    def modified_at(self, key: str) -> Optional[float]:
+        head = self._head(key)
+        return head["LastModified"].timestamp() if head else None
+
+    def touch(self, key: str):
+        # An in-place copy refreshes LastModified without re-sending the bytes
+        self.copy(key, key)
+
+    def copy(self, source_key: str, key: str):
+        self.client.copy_object(
+            Bucket=self.bucket, Key=key, CopySource={"Bucket": self.bucket, "Key": source_key},
+            MetadataDirective="REPLACE", ContentType=content_type(key), CacheControl=IMMUTABLE_CACHE_CONTROL,
+        )
+
+    def store_file(self, source_path: str, key: str):
+        """Upload a local file to key and remove the local copy"""
+        self.client.upload_file(
+            source_path, self.bucket, key,
+            ExtraArgs={"ContentType": content_type(key), "CacheControl": IMMUTABLE_CACHE_CONTROL},
+        )
+        os.remove(source_path)
+
+    def read_bytes(self, key: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+
+    def iter_chunks(self, key: str, chunk_size: int):
+        """Stream an object; yields nothing if it does not exist"""
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return
+            raise
+        with body:
+            yield from body.iter_chunks(chunk_size)
+
+    def write_bytes(self, key: str, data: bytes):
+        """Store generated data (image variants), revalidated by caches"""
+        self.client.put_object(
+            Bucket=self.bucket, Key=key, Body=data,
+            ContentType=content_type(key), CacheControl=REVALIDATE_CACHE_CONTROL,
+        )
+
+    def delete(self, keys: list):
+        for start in range(0, len(keys), 1000):  # DeleteObjects limit
+            batch = keys[start:start + 1000]
+            self.client.delete_objects(
+                Bucket=self.bucket, Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True}
+            )
+
+    def download_url(self, key: str) -> str:
+        if S3_PUBLIC_URL:
+            return f"{S3_PUBLIC_URL.rstrip('/')}/{key}"
+        return self.presign_client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=S3_URL_EXPIRES_SECONDS
+        )
+
+    def presigned_upload(self, key: str, max_size: int) -> dict:
+        """Presigned POST (url and form fields) for uploading at most max_size bytes to key"""
+        return self.presign_client.generate_presigned_post(
+            self.bucket, key,
+            Conditions=[["content-length-range", 1, max_size]],
+            ExpiresIn=S3_URL_EXPIRES_SECONDS,
+        )
+
+_storage = None
+
+def get_storage():
+    """Return the configured storage backend"""
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND == "s3":
+            _storage = S3Storage(S3_BUCKET, S3_ENDPOINT_URL, S3_REGION, S3_PRESIGN_ENDPOINT_URL)
+        else:
+            _storage = LocalStorage()
+    return _storage
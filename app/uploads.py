@@ -0,0 +1,226 @@
+"""
+Profile image uploads
+
+One pipeline for every upload route. Multipart request bodies are capped
+by UploadSizeLimitMiddleware while they stream in, before the form is
+parsed. save_uploaded_file() then copies the upload to a temp file in
+UPLOAD_CHUNK_SIZE chunks, stops as soon as MAX_FILE_SIZE is exceeded,
+checks the image type from its magic bytes, and moves the file into
+storage (app.storage): an atomic rename locally, an upload with S3.
+
+Files are content-addressed: an image is stored once under its SHA-256
+(ab/ab12...ef.png) however many users upload it. Every stored blob gets
+an image_blobs row, references are counted there, and unreferenced blobs
+are removed by app.blobs.
+
+With object storage, clients can also upload straight to the bucket:
+create_direct_upload() hands out a presigned POST to a staging key, and
+finalize_direct_upload() applies the same checks to the staged object
+before copying it to its content-addressed key.
+"""
+import asyncio
+import hashlib
+import os
+import secrets
+import tempfile
+import aiofiles
+from fastapi import HTTPException, UploadFile, status
+from app.blobs import track_blob
+from app.storage import S3_URL_EXPIRES_SECONDS, get_storage, image_url
+
+# Upload settings (use environment variables)
+MAX_FILE_SIZE = 2 * 1024 * 1024  # 2MB
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))  # bytes held in memory per upload
+# Multipart request limit: the image plus room for the other form fields
+MAX_UPLOAD_REQUEST_SIZE = MAX_FILE_SIZE + 64 * 1024
+# Client-side uploads land here until they are verified (expire them with a bucket lifecycle rule)
+DIRECT_UPLOAD_PREFIX = "incoming/"
+
+# Leading bytes of the allowed image types, and the extension they are stored with
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": ".jpg",
+    b"\x89PNG\r\n\x1a\n": ".png",
+}
+
+def _file_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+        detail="File size must be less than 2MB"
+    )
+
+def _not_an_image() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Only JPG and PNG files are allowed"
+    )
+
+def sniff_image_type(head: bytes):
+    """Extension for the image type identified by its magic bytes, or None"""
+    for signature, extension in IMAGE_SIGNATURES.items():
+        if head.startswith(signature):
+            return extension
+    return None
+
+def blob_key(digest: str, extension: str) -> str:
+    """Storage key of the blob with the given SHA-256 hex digest"""
+    return f"{digest[:2]}/{digest}{extension}"
+
+def _store_blob(storage, source_path: str, key: str):
+    """Store a verified image under its blob key, once per distinct content"""
+    if storage.exists(key):
+        # Already stored; the fresh modification time keeps the garbage collector off it
+        storage.touch(key)
+        os.remove(source_path)
+    else:
+        storage.store_file(source_path, key)
+
+async def save_uploaded_file(file: UploadFile) -> str:
+    """Save an uploaded JPG/PNG image (once per distinct content) and return its URL path"""
+    head = await file.read(UPLOAD_CHUNK_SIZE)
+    extension = sniff_image_type(head)
+    if extension is None:
+        raise _not_an_image()
+
+    storage = get_storage()
+    fd, temp_path = tempfile.mkstemp(dir=storage.temp_dir, prefix=".upload-", suffix=".tmp")
+    os.close(fd)
+    try:
+        size = 0
+        digest = hashlib.sha256()
+        chunk = head
+        async with aiofiles.open(temp_path, "wb") as f:
+            while chunk:
+                size += len(chunk)
+                if size > MAX_FILE_SIZE:
+                    raise _file_too_large()
+                digest.update(chunk)
+                await f.write(chunk)
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+
+        # Named by content: the client's filename is never used in storage
+        key = blob_key(digest.hexdigest(), extension)
+        await asyncio.to_thread(_store_blob, storage, temp_path, key)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    await track_blob(image_url(key))
+    return image_url(key)
+
+def _direct_uploads_unavailable() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Direct uploads require STORAGE_BACKEND=s3"
+    )
+
+def direct_upload_key(user_id: int) -> str:
+    """Staging key for a client-side upload; the random part makes it unguessable"""
+    return f"{DIRECT_UPLOAD_PREFIX}{user_id}/{secrets.token_urlsafe(16)}"
+
+def _finalize_direct_upload(storage, staging_key: str) -> str:
+    """Check a staged upload like save_uploaded_file does and copy it to its blob key"""
+    if storage.size(staging_key) is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Upload not found; request a new upload URL"
+        )
+    try:
+        size = 0
+        digest = hashlib.sha256()
+        extension = None
+        for chunk in storage.iter_chunks(staging_key, UPLOAD_CHUNK_SIZE):
+            if extension is None:
+                extension = sniff_image_type(chunk)
+                if extension is None:
+                    raise _not_an_image()
+            size += len(chunk)
+            if size > MAX_FILE_SIZE:
+                raise _file_too_large()
+            digest.update(chunk)
+        if extension is None:
+            raise _not_an_image()
+
+        key = blob_key(digest.hexdigest(), extension)
+        if storage.exists(key):
+            storage.touch(key)
+        else:
+            storage.copy(staging_key, key)
+        return key
+    finally:
+        storage.delete([staging_key])
+
+async def finalize_direct_upload(user_id: int, upload_id: str) -> str:
+    """Verify an image the client uploaded straight to storage and return its URL path"""
+    storage = get_storage()
+    if not storage.supports_direct_upload:
+        raise _direct_uploads_unavailable()
+    if not upload_id.startswith(f"{DIRECT_UPLOAD_PREFIX}{user_id}/"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid upload id"
+        )
+    key = await asyncio.to_thread(_finalize_direct_upload, storage, upload_id)
+    await track_blob(image_url(key))
+    return image_url(key)
+
+async def create_direct_upload(user_id: int) -> dict:
+    """Presigned POST for uploading a profile image straight to storage"""
+    storage = get_storage()
+    if not storage.supports_direct_upload:
+        raise _direct_uploads_unavailable()
+    upload_id = direct_upload_key(user_id)
+    presigned = await asyncio.to_thread(storage.presigned_upload, upload_id, MAX_FILE_SIZE)
+    return {
+        "upload_id": upload_id,
+        "url": presigned["url"],
+        "fields": presigned["fields"],
+        "max_size": MAX_FILE_SIZE,
+        "expires_in": S3_URL_EXPIRES_SECONDS,
+    }
+
+class UploadSizeLimitMiddleware:
+    """Reject multipart requests larger than max_size while the body streams in.
+
+    Requests with a Content-Length over the limit are refused before any of
+    the body is read; chunked bodies are counted and cut off at the limit.
+    """
+
+    def __init__(self, app, max_size: int = MAX_UPLOAD_REQUEST_SIZE):
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            return await self.app(scope, receive, send)
+
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_size:
+            return await self._reject(send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    # Raised inside the route's body parsing, so it becomes a 413 response
+                    raise _file_too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    async def _reject(self, send):
+        exc = _file_too_large()
+        body = ('{"detail":"%s"}' % exc.detail).encode()
+        await send({
+            "type": "http.response.start",
+            "status": exc.status_code,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), (b"connection", b"close")],
+        })
+        await send({"type": "http.response.body", "body": body})
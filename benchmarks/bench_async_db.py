@@ -0,0 +1,91 @@
+"""
+Load test: concurrent request throughput with sync vs async sessions
+Runs CONCURRENCY simulated requests at a time on one event loop. Each
+request does the same user lookup as get_user, once through the old sync
+SessionLocal (blocking the loop) and once through AsyncSessionLocal.
+Alongside throughput it reports the worst event-loop stall, which is
+what every other request on the worker waits behind.
+
+Point DATABASE_URL at PostgreSQL to include network round trips.
+
+Usage: python benchmarks/bench_async_db.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench_async_db.db")
+
+from sqlalchemy import select
+from app.database import Base, engine, async_engine, SessionLocal, AsyncSessionLocal
+from app.models import User
+
+REQUESTS = int(os.getenv("REQUESTS", "5000"))
+CONCURRENCY = int(os.getenv("CONCURRENCY", "50"))
+SEED_USERS = int(os.getenv("SEED_USERS", "1000"))
+
+def seed():
+    """Create SEED_USERS users if the table is empty"""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if db.query(User).count() >= SEED_USERS:
+            return
+        db.add_all([
+            User(name="Bench User", email=f"bench{i}@example.com", phone=f"9{i:09d}", password="x",
+                 state="State", city="City", country="Country", pincode="12345")
+            for i in range(SEED_USERS)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+async def sync_request(user_id):
+    db = SessionLocal()
+    try:
+        return db.query(User).filter(User.id == user_id).first()
+    finally:
+        db.close()
+
+async def async_request(user_id):
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(User).where(User.id == user_id))
+
+async def measure_lag(stop, lags):
+    """Record how late a 1 ms timer fires while requests run"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - start - 0.001)
+
+async def run(handler):
+    """Run REQUESTS requests CONCURRENCY at a time; return (req/sec, max loop lag ms)"""
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(i):
+        async with semaphore:
+            await handler(i % SEED_USERS + 1)
+
+    stop, lags = asyncio.Event(), []
+    ticker = asyncio.create_task(measure_lag(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(REQUESTS)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticker
+    return REQUESTS / elapsed, max(lags, default=0) * 1000
+
+async def main():
+    print("=" * 60)
+    print(f"Sync vs async sessions ({REQUESTS} requests, concurrency {CONCURRENCY})")
+    print("=" * 60)
+    seed()
+    for label, handler in (("sync Session", sync_request), ("AsyncSession", async_request)):
+        throughput, lag = await run(handler)
+        print(f"{label:<14} {throughput:10,.0f} req/sec   max loop stall {lag:8.2f} ms")
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
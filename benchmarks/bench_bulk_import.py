@@ -0,0 +1,72 @@
+"""
+Benchmark: bulk import throughput (rows/sec) through POST /api/users/import
+Generates IMPORT_ROWS synthetic users, uploads them as NDJSON and as CSV,
+and compares rows/sec against TARGET_ROWS_PER_SEC. Throughput is bound by
+bcrypt, so the default target scales with the hashing workers an import
+may use, all but one (about 3 hashes/sec per core at the default cost factor).
+
+Usage: start the server, run 'python create_admin.py', then
+    python benchmarks/bench_bulk_import.py
+"""
+import json
+import os
+import time
+import requests
+
+BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
+ADMIN_EMAIL = os.getenv("ADMIN_EMAIL", "admin@example.com")
+ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "admin123")
+IMPORT_ROWS = int(os.getenv("IMPORT_ROWS", "2000"))
+TARGET_ROWS_PER_SEC = float(os.getenv("TARGET_ROWS_PER_SEC", str(3 * max(1, (os.cpu_count() or 1) - 1))))
+
+def admin_headers():
+    response = requests.post(
+        f"{BASE_URL}/api/auth/login",
+        json={"email_or_phone": ADMIN_EMAIL, "password": ADMIN_PASSWORD}
+    )
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def synthetic_rows(prefix):
+    run_id = int(time.time()) % 100000
+    for i in range(IMPORT_ROWS):
+        yield {
+            "name": "Imported User",
+            "email": f"{prefix}{run_id}_{i}@example.com",
+            "phone": f"{5 if prefix == 'nd' else 6}{run_id:05d}{i:05d}",
+            "password": "import123",
+            "state": "State",
+            "city": "City",
+            "country": "Country",
+            "pincode": "12345"
+        }
+
+def ndjson_body():
+    return "".join(json.dumps(row) + "\n" for row in synthetic_rows("nd")).encode()
+
+def csv_body():
+    fields = ["name", "email", "phone", "password", "state", "city", "country", "pincode"]
+    lines = [",".join(fields)] + [",".join(row[field] for field in fields) for row in synthetic_rows("csv")]
+    return ("\n".join(lines) + "\n").encode()
+
+def run(label, export_format, body, headers):
+    start = time.perf_counter()
+    response = requests.post(f"{BASE_URL}/api/users/import?format={export_format}", data=body, headers=headers)
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    result = response.json()
+    rate = result["imported"] / elapsed
+    status_symbol = "[PASS]" if rate >= TARGET_ROWS_PER_SEC else "[FAIL]"
+    print(f"{status_symbol} {label:<7} imported {result['imported']:>6}/{result['total_rows']:<6} "
+          f"in {elapsed:7.1f}s  {rate:8.1f} rows/sec (target {TARGET_ROWS_PER_SEC:.0f})")
+
+def main():
+    print("=" * 60)
+    print(f"Bulk import throughput ({IMPORT_ROWS} rows)")
+    print("=" * 60)
+    headers = admin_headers()
+    run("NDJSON", "ndjson", ndjson_body(), headers)
+    run("CSV", "csv", csv_body(), headers)
+
+if __name__ == "__main__":
+    main()
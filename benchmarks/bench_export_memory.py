@@ -0,0 +1,74 @@
+"""
+Memory test: stream an export of EXPORT_ROWS users under a fixed RSS ceiling
+Seeds EXPORT_ROWS synthetic users into a scratch SQLite database. Then it
+drains GET /api/users/export in both formats by calling the handler
+directly, and checks that peak RSS grew by less than RSS_CEILING_MB.
+Exits with status 1 if the ceiling is exceeded.
+
+Usage: python benchmarks/bench_export_memory.py
+"""
+import asyncio
+import os
+import resource
+import sys
+import tempfile
+import time
+
+TMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{TMP_DIR}/bench_export.db"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import Base, engine, async_engine, upgrade_schema
+from app.routers.users import export_users
+
+EXPORT_ROWS = int(os.getenv("EXPORT_ROWS", "1000000"))
+RSS_CEILING_MB = float(os.getenv("RSS_CEILING_MB", "64"))
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (ru_maxrss is KB on Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    connection = engine.raw_connection()
+    try:
+        connection.executemany(
+            "INSERT INTO users (name, email, phone, password, state, city, country, pincode, role) "
+            "VALUES (?, ?, ?, 'x', 'State', 'City', 'Country', '12345', 'USER')",
+            ((f"User{i}", f"bench{i}@example.com", f"9{i:09d}") for i in range(EXPORT_ROWS)),
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+async def drain(export_format):
+    """Consume the streamed export; return (rows, bytes, seconds)"""
+    response = await export_users(format=export_format, search=None, state=None, city=None, current_user=None)
+    rows = size = 0
+    start = time.perf_counter()
+    async for chunk in response.body_iterator:
+        size += len(chunk)
+        rows += chunk.count("\n")
+    return rows, size, time.perf_counter() - start
+
+async def main():
+    print("=" * 60)
+    print(f"Streaming export of {EXPORT_ROWS:,} users (RSS ceiling +{RSS_CEILING_MB:.0f} MB)")
+    print("=" * 60)
+    seed()
+    baseline = peak_rss_mb()
+    passed = True
+    for export_format in ("ndjson", "csv"):
+        rows, size, elapsed = await drain(export_format)
+        growth = peak_rss_mb() - baseline
+        ok = growth < RSS_CEILING_MB
+        passed = passed and ok
+        status_symbol = "[PASS]" if ok else "[FAIL]"
+        print(f"{status_symbol} {export_format:<6} {rows:>10,} lines  {size / 1e6:8.1f} MB  "
+              f"{rows / elapsed:10,.0f} rows/sec  peak RSS +{growth:.1f} MB")
+    await async_engine.dispose()
+    sys.exit(0 if passed else 1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+"""
+Benchmark: request latency while logins are running
+Measures p50/p99 latency of /health and /api/users/{id} on their own and
+while concurrent logins hash passwords. With the hashing executor the
+numbers under load should stay close to the idle numbers.
+
+Usage: start the server (single worker), then run
+    python benchmarks/bench_login_latency.py
+"""
+import os
+import statistics
+import threading
+import time
+import requests
+
+BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
+PROBES = int(os.getenv("PROBES", "200"))
+LOGIN_THREADS = int(os.getenv("LOGIN_THREADS", "8"))
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of samples (in milliseconds)"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index] * 1000
+
+def register_user():
+    """Register a throwaway user and return (user_id, email, password, token)"""
+    suffix = str(int(time.time() * 1000))[-9:]
+    user_data = {
+        "name": "Bench User",
+        "email": f"bench{suffix}@example.com",
+        "phone": f"9{suffix}",
+        "password": "bench123",
+        "state": "State",
+        "city": "City",
+        "country": "Country",
+        "pincode": "12345"
+    }
+    response = requests.post(f"{BASE_URL}/api/auth/register", json=user_data)
+    response.raise_for_status()
+    user = response.json()
+    tokens = requests.post(
+        f"{BASE_URL}/api/auth/login",
+        json={"email_or_phone": user_data["email"], "password": user_data["password"]}
+    ).json()
+    return user["id"], user_data["email"], user_data["password"], tokens["access_token"]
+
+def probe(url, headers=None):
+    """Time PROBES sequential GET requests against url"""
+    samples = []
+    session = requests.Session()
+    for _ in range(PROBES):
+        start = time.perf_counter()
+        session.get(url, headers=headers)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def login_loop(email, password, stop):
+    """Log in repeatedly until stop is set"""
+    session = requests.Session()
+    while not stop.is_set():
+        session.post(f"{BASE_URL}/api/auth/login", json={"email_or_phone": email, "password": password})
+
+def report(label, samples):
+    print(f"{label:<32} p50={percentile(samples, 50):7.2f} ms  "
+          f"p99={percentile(samples, 99):7.2f} ms  mean={statistics.mean(samples) * 1000:7.2f} ms")
+
+def main():
+    print("=" * 60)
+    print("Latency under concurrent logins")
+    print("=" * 60)
+    user_id, email, password, token = register_user()
+    headers = {"Authorization": f"Bearer {token}"}
+    targets = [
+        ("/health", f"{BASE_URL}/health", None),
+        (f"/api/users/{user_id}", f"{BASE_URL}/api/users/{user_id}", headers),
+    ]
+
+    for label, url, hdrs in targets:
+        report(f"{label} (idle)", probe(url, hdrs))
+
+    stop = threading.Event()
+    workers = [
+        threading.Thread(target=login_loop, args=(email, password, stop), daemon=True)
+        for _ in range(LOGIN_THREADS)
+    ]
+    for worker in workers:
+        worker.start()
+    time.sleep(1)  # let the login load ramp up
+    try:
+        for label, url, hdrs in targets:
+            report(f"{label} ({LOGIN_THREADS} logins)", probe(url, hdrs))
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+if __name__ == "__main__":
+    main()
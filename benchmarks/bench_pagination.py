@@ -0,0 +1,80 @@
+"""
+Benchmark: GET /api/users latency by page depth, offset vs cursor
+Seeds SEED_USERS rows into a scratch SQLite database and calls the
+get_users handler directly (with count=none, so only the page query is
+timed). It compares page=N (OFFSET) with the equivalent cursor (keyset)
+request at increasing depths.
+
+Usage: python benchmarks/bench_pagination.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+TMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{TMP_DIR}/bench_pagination.db"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import Request, Response
+from app.database import Base, engine, async_engine, upgrade_schema, AsyncSessionLocal
+from app.routers.users import get_users
+
+SEED_USERS = int(os.getenv("SEED_USERS", "200000"))
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "20"))
+DEPTHS = [1, 10, 100, 1000, 5000]
+REPEAT = int(os.getenv("REPEAT", "5"))
+
+# Plain (unconditional) GET /api/users request for calling the handler directly
+LIST_REQUEST = Request({"type": "http", "method": "GET", "path": "/api/users", "query_string": b"", "headers": []})
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    connection = engine.raw_connection()
+    try:
+        connection.executemany(
+            "INSERT INTO users (name, email, phone, password, state, city, country, pincode, role, created_at) "
+            "VALUES (?, ?, ?, 'x', 'State', 'City', 'Country', '12345', 'USER', ?)",
+            (
+                ("Bench User", f"bench{i}@example.com", f"9{i:09d}",
+                 time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(1_600_000_000 + i // 3)))
+                for i in range(SEED_USERS)
+            ),
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+async def list_users(db, page=1, cursor=None):
+    return await get_users(request=LIST_REQUEST, response=Response(),
+                           page=page, page_size=PAGE_SIZE, search=None, state=None, city=None,
+                           cursor=cursor, count="none", fields=None, db=db, current_user=None)
+
+async def timed(db, **kwargs):
+    """Best-of-REPEAT latency in milliseconds"""
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        await list_users(db, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+async def main():
+    print("=" * 60)
+    print(f"GET /api/users by page depth ({SEED_USERS:,} users, page_size {PAGE_SIZE})")
+    print("=" * 60)
+    seed()
+    async with AsyncSessionLocal() as db:
+        print(f"{'page':>6} {'offset ms':>12} {'cursor ms':>12}")
+        for depth in DEPTHS:
+            # The cursor that leads to page `depth` is next_cursor of page depth-1
+            cursor = (await list_users(db, page=depth - 1))["next_cursor"] if depth > 1 else None
+            offset_ms = await timed(db, page=depth)
+            cursor_ms = await timed(db, page=depth, cursor=cursor)
+            print(f"{depth:>6} {offset_ms:>12.2f} {cursor_ms:>12.2f}")
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
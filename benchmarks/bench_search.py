@@ -0,0 +1,81 @@
+"""
+Benchmark: GET /api/users?search= latency, ILIKE scan vs search index
+Seeds SEED_USERS rows into a scratch SQLite database (the FTS5 index is
+kept in sync by triggers while seeding) and calls the get_users handler
+directly, with the search index disabled and enabled.
+
+Usage: python benchmarks/bench_search.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+TMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{TMP_DIR}/bench_search.db"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.search
+from fastapi import Request, Response
+from app.database import Base, engine, async_engine, upgrade_schema, AsyncSessionLocal
+from app.routers.users import get_users
+from app.cache import count_cache
+from app.search import ensure_search_index
+
+SEED_USERS = int(os.getenv("SEED_USERS", "500000"))
+REPEAT = int(os.getenv("REPEAT", "5"))
+TERMS = ["user4242", "bench99999", "Kochi", "no-such-user"]
+CITIES = ["Kochi", "Pune", "Delhi", "Chennai", "Mumbai", "Jaipur", "Indore", "Surat"]
+
+# Plain (unconditional) GET /api/users request for calling the handler directly
+LIST_REQUEST = Request({"type": "http", "method": "GET", "path": "/api/users", "query_string": b"", "headers": []})
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    ensure_search_index(engine)
+    connection = engine.raw_connection()
+    try:
+        connection.executemany(
+            "INSERT INTO users (name, email, phone, password, state, city, country, pincode, role) "
+            "VALUES (?, ?, ?, 'x', 'State', ?, 'Country', '12345', 'USER')",
+            (
+                (f"User{i}", f"bench{i}@example.com", f"9{i:09d}", CITIES[i % len(CITIES)])
+                for i in range(SEED_USERS)
+            ),
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+async def timed(db, term):
+    """Best-of-REPEAT latency in milliseconds and the match count"""
+    best, total = float("inf"), None
+    for _ in range(REPEAT):
+        count_cache.clear()
+        start = time.perf_counter()
+        result = await get_users(request=LIST_REQUEST, response=Response(),
+                                 page=1, page_size=10, search=term, state=None, city=None,
+                                 cursor=None, count="exact", fields=None, db=db, current_user=None)
+        best = min(best, time.perf_counter() - start)
+        total = result["total"]
+    return best * 1000, total
+
+async def main():
+    print("=" * 60)
+    print(f"User search latency ({SEED_USERS:,} users)")
+    print("=" * 60)
+    seed()
+    async with AsyncSessionLocal() as db:
+        print(f"{'term':<14} {'matches':>8} {'ILIKE ms':>10} {'index ms':>10}")
+        for term in TERMS:
+            app.search.search_index_enabled = False
+            ilike_ms, total = await timed(db, term)
+            app.search.search_index_enabled = True
+            index_ms, _ = await timed(db, term)
+            print(f"{term:<14} {total:>8} {ilike_ms:>10.2f} {index_ms:>10.2f}")
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""
+Benchmark: GET /api/users payload size and latency, all fields vs fields=
+Seeds SEED_USERS rows into a scratch SQLite database and calls the
+get_users handler directly (count=none). Each call includes serializing
+the page to JSON. It compares the full UserResponse with the mobile field
+set SPARSE_FIELDS.
+
+Usage: python benchmarks/bench_sparse_fields.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+TMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{TMP_DIR}/bench_sparse_fields.db"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import Request, Response
+from app.database import Base, engine, async_engine, upgrade_schema, AsyncSessionLocal
+from app.routers.users import get_users
+from app.schemas import PaginatedResponse
+
+SEED_USERS = int(os.getenv("SEED_USERS", "50000"))
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "100"))
+SPARSE_FIELDS = os.getenv("SPARSE_FIELDS", "id,name,profile_image")
+REPEAT = int(os.getenv("REPEAT", "20"))
+
+# Plain (unconditional) GET /api/users request for calling the handler directly
+LIST_REQUEST = Request({"type": "http", "method": "GET", "path": "/api/users", "query_string": b"", "headers": []})
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    connection = engine.raw_connection()
+    try:
+        connection.executemany(
+            "INSERT INTO users (name, email, phone, password, profile_image, address, "
+            "state, city, country, pincode, role) "
+            "VALUES (?, ?, ?, 'x', ?, ?, 'Kerala', 'Thiruvananthapuram', 'India', '695001', 'USER')",
+            (
+                (f"Bench User {i}", f"bench{i}@example.com", f"9{i:09d}",
+                 f"/uploads/user_{i}_avatar.png", f"House {i}, Long Street Name, Near The Big Junction")
+                for i in range(SEED_USERS)
+            ),
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+async def fetch_page(db, fields):
+    """One page rendered to JSON bytes, as the endpoint would send it"""
+    result = await get_users(request=LIST_REQUEST, response=Response(),
+                             page=1, page_size=PAGE_SIZE, search=None, state=None, city=None,
+                             cursor=None, count="none", fields=fields, db=db, current_user=None)
+    if isinstance(result, Response):
+        return result.body
+    return PaginatedResponse.model_validate(result).model_dump_json().encode()
+
+async def timed(db, fields):
+    """Best-of-REPEAT latency in milliseconds and the payload size in bytes"""
+    best, size = float("inf"), 0
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        size = len(await fetch_page(db, fields))
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, size
+
+async def main():
+    print("=" * 60)
+    print(f"GET /api/users payload ({SEED_USERS:,} users, page_size {PAGE_SIZE})")
+    print("=" * 60)
+    seed()
+    async with AsyncSessionLocal() as db:
+        print(f"{'fields':<24} {'bytes':>10} {'ms':>10}")
+        full_ms, full_size = await timed(db, None)
+        sparse_ms, sparse_size = await timed(db, SPARSE_FIELDS)
+        print(f"{'(all)':<24} {full_size:>10,} {full_ms:>10.2f}")
+        print(f"{SPARSE_FIELDS:<24} {sparse_size:>10,} {sparse_ms:>10.2f}")
+        print(f"payload {sparse_size / full_size:.0%} of full, latency {sparse_ms / full_ms:.0%} of full")
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""
+Benchmark: mixed read/write throughput on SQLite with 4 uvicorn workers
+Starts the API twice on a fresh database, once with the default SQLite
+settings and once with SQLITE_PROFILE=production. Each time it runs the
+same mix of profile reads and profile updates from several threads. It
+reports requests/sec and the number of failed requests (mostly
+"database is locked").
+
+Usage: python benchmarks/bench_sqlite_profile.py
+"""
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = int(os.getenv("PORT", "8765"))
+WORKERS = int(os.getenv("WORKERS", "4"))
+CLIENTS = int(os.getenv("CLIENTS", "16"))
+DURATION = float(os.getenv("DURATION", "15"))
+WRITE_RATIO = float(os.getenv("WRITE_RATIO", "0.3"))
+BASE_URL = f"http://127.0.0.1:{PORT}"
+
+def start_server(db_path, profile):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", SQLITE_PROFILE=profile)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PORT), "--workers", str(WORKERS)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            if requests.get(f"{BASE_URL}/health").status_code == 200:
+                return server
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("server did not start")
+
+def create_client(index):
+    """Register and log in one user; return (user_id, auth headers)"""
+    user_data = {
+        "name": "Bench User",
+        "email": f"bench{index}@example.com",
+        "phone": f"9{index:09d}",
+        "password": "bench123",
+        "state": "State",
+        "city": "City",
+        "country": "Country",
+        "pincode": "12345"
+    }
+    user = requests.post(f"{BASE_URL}/api/auth/register", json=user_data).json()
+    tokens = requests.post(
+        f"{BASE_URL}/api/auth/login",
+        json={"email_or_phone": user_data["email"], "password": user_data["password"]}
+    ).json()
+    return user["id"], {"Authorization": f"Bearer {tokens['access_token']}"}
+
+def client_loop(user_id, headers, deadline, counters, lock):
+    session = requests.Session()
+    ok = failed = 0
+    while time.time() < deadline:
+        if random.random() < WRITE_RATIO:
+            response = session.put(f"{BASE_URL}/api/users/{user_id}", headers=headers,
+                                   json={"city": random.choice(["Pune", "Delhi", "Kochi"])})
+        else:
+            response = session.get(f"{BASE_URL}/api/users/{user_id}", headers=headers)
+        if response.status_code == 200:
+            ok += 1
+        else:
+            failed += 1
+    with lock:
+        counters["ok"] += ok
+        counters["failed"] += failed
+
+def run(profile):
+    with tempfile.TemporaryDirectory() as tmp:
+        server = start_server(os.path.join(tmp, "bench.db"), profile)
+        try:
+            clients = [create_client(i) for i in range(CLIENTS)]
+            counters, lock = {"ok": 0, "failed": 0}, threading.Lock()
+            deadline = time.time() + DURATION
+            threads = [
+                threading.Thread(target=client_loop, args=(user_id, headers, deadline, counters, lock))
+                for user_id, headers in clients
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            server.terminate()
+            server.wait()
+    print(f"{profile:<12} {counters['ok'] / DURATION:8,.0f} req/sec   failed: {counters['failed']}")
+
+def main():
+    print("=" * 60)
+    print(f"SQLite mixed read/write, {WORKERS} workers, {CLIENTS} clients, {WRITE_RATIO:.0%} writes")
+    print("=" * 60)
+    for profile in ("default", "production"):
+        run(profile)
+
+if __name__ == "__main__":
+    main()
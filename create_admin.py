@@ -2,9 +2,10 @@
 Script to create an admin user
 Run this script to create an admin user in the database
 """
+import asyncio
 from app.database import SessionLocal
 from app.models import User, UserRole
-from app.auth import get_password_hash
+from app.hashing import hash_password_async, shutdown_hash_executor
 
 def create_admin():
     db = SessionLocal()
@@ -20,7 +21,7 @@ def create_admin():
             name="Admin User",
             email="admin@example.com",
             phone="9999999999",
-            password=get_password_hash("admin123"),
+            password=asyncio.run(hash_password_async("admin123")),
             state="State",
             city="City",
             country="Country",
@@ -38,6 +39,7 @@ def create_admin():
         db.rollback()
     finally:
         db.close()
+        shutdown_hash_executor()
 
 if __name__ == "__main__":
     create_admin()
@@ -0,0 +1,45 @@
+"""
+Script to backfill profile image thumbnails and WebP variants
+Run this script after upgrading, or with --all after changing THUMBNAIL_SIZES
+"""
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from app.database import SessionLocal
+from app.models import User
+from app.images import IMAGE_WORKERS, generate_variants
+
+def _generate(image_path: str):
+    try:
+        return generate_variants(image_path)
+    except Exception as e:
+        print(f"Skipping {image_path}: {e}")
+        return None
+
+def main(regenerate: bool = False):
+    db = SessionLocal()
+    try:
+        query = db.query(User).filter(User.profile_image.isnot(None))
+        if not regenerate:
+            query = query.filter(User.profile_image_variants.is_(None))
+        users = query.all()
+        if not users:
+            print("All profile images already have variants.")
+            return
+
+        with ProcessPoolExecutor(max_workers=IMAGE_WORKERS) as executor:
+            results = executor.map(_generate, [user.profile_image for user in users], chunksize=8)
+            processed = 0
+            for user, variants in zip(users, results):
+                if variants is not None:
+                    user.profile_image_variants = variants
+                    processed += 1
+        db.commit()
+        print(f"Generated variants for {processed} of {len(users)} profile images.")
+    except Exception as e:
+        print(f"Error generating image variants: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main(regenerate="--all" in sys.argv[1:])
@@ -0,0 +1,20 @@
+"""
+Script to rebuild the user search index
+Run this script after restoring a database or changing users outside the API
+"""
+from app.database import engine
+from app.search import rebuild_search_index
+import app.search
+
+def main():
+    try:
+        rebuild_search_index(engine)
+        if app.search.search_index_enabled:
+            print("Search index rebuilt successfully!")
+        else:
+            print("Search index is not available for this database; ILIKE search is used instead.")
+    except Exception as e:
+        print(f"Error rebuilding search index: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@
 Automated API Testing Script
 Tests all endpoints of the User Management System
 """
+import os
 import requests
 import json
 import time
@@ -239,6 +240,35 @@ def test_search_users(admin_token):
     except Exception as e:
         print_test("Search Users", False, f"Error: {str(e)}")
 
+def test_import_users_csv(admin_token):
+    """Test CSV import with a quoted field that spans lines"""
+    print("\n[TEST] Testing CSV Import (multi-line field)...")
+    
+    if not admin_token:
+        print_test("CSV Import", False, "No admin token")
+        return
+    
+    suffix = int(time.time()) % 1000000
+    body = (
+        "name,email,phone,password,state,city,country,pincode,address\r\n"
+        f'Csv Import,csvimport{suffix}@example.com,88{suffix:08d},test123,State,City,Country,12345,'
+        '"Flat 4, Block B\r\nMain Road"\r\n'
+    )
+    
+    try:
+        headers = {"Authorization": f"Bearer {admin_token}", "Content-Type": "text/csv"}
+        response = requests.post(f"{BASE_URL}/api/users/import?format=csv", headers=headers, data=body.encode())
+        if response.status_code == 200:
+            data = response.json()
+            if data.get("total_rows") == 1 and data.get("imported") == 1:
+                print_test("CSV Import", True, "Multi-line address imported as one row")
+            else:
+                print_test("CSV Import", False, f"Expected 1 row imported, got {data}")
+        else:
+            print_test("CSV Import", False, f"Status: {response.status_code}")
+    except Exception as e:
+        print_test("CSV Import", False, f"Error: {str(e)}")
+
 def test_unauthorized_access():
     """Test unauthorized access"""
     print("\n[TEST] Testing Unauthorized Access...")
@@ -327,8 +357,16 @@ def main():
     
     # Note: Admin endpoints require admin token
     # You need to create an admin user first using create_admin.py
-    print("\n[WARNING] Admin endpoint tests require admin user.")
-    print("   Run 'python create_admin.py' first, then login to get admin token.")
+    admin_email = os.getenv("ADMIN_EMAIL")
+    admin_password = os.getenv("ADMIN_PASSWORD")
+    if admin_email and admin_password:
+        admin_token, _ = test_user_login(admin_email, admin_password)
+        test_get_users(admin_token)
+        test_search_users(admin_token)
+        test_import_users_csv(admin_token)
+    else:
+        print("\n[WARNING] Admin endpoint tests require admin user.")
+        print("   Run 'python create_admin.py' first, then set ADMIN_EMAIL and ADMIN_PASSWORD.")
     
     # Print summary
     print("\n" + "=" * 60)
@@ -0,0 +1,155 @@
+"""
+Read Replica Routing Test
+Runs the app in-process against two SQLite files: the primary and a copy
+of it as the read replica (DATABASE_READ_URL). Checks that read-only
+endpoints are served by the replica, that the db_primary_until cookie set
+after a write sends the client's reads back to the primary, and that a
+read session that writes stays on the primary.
+
+Usage: python test_read_replica.py
+"""
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+WORK_DIR = tempfile.mkdtemp(prefix="read-replica-test-")
+PRIMARY_PATH = os.path.join(WORK_DIR, "primary.db")
+REPLICA_PATH = os.path.join(WORK_DIR, "replica.db")
+# Must be set before the app (and its engines) are imported
+os.environ["DATABASE_URL"] = f"sqlite:///{PRIMARY_PATH}"
+os.environ["DATABASE_READ_URL"] = f"sqlite:///{REPLICA_PATH}"
+os.environ.setdefault("PRIMARY_STICKY_SECONDS", "30")
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from app.main import app
+from app.database import PRIMARY_STICKY_COOKIE, AsyncReadSessionLocal, SessionLocal
+from app.hashing import get_password_hash
+from app.models import User, UserRole
+
+ADMIN_EMAIL = "replica-admin@example.com"
+ADMIN_PASSWORD = "admin123"
+test_results = []
+
+def print_test(name, status, message=""):
+    """Print test result"""
+    status_symbol = "[PASS]" if status else "[FAIL]"
+    print(f"{status_symbol} {name}")
+    if message:
+        print(f"   {message}")
+    test_results.append((name, status, message))
+
+def new_user_data(suffix):
+    return {
+        "name": "Replica Test",
+        "email": f"replica{suffix}@example.com",
+        "phone": f"77{suffix:08d}",
+        "password": "test123",
+        "state": "State",
+        "city": "City",
+        "country": "Country",
+        "pincode": "12345"
+    }
+
+def create_admin_and_replica():
+    """Create an admin on the primary, then copy the primary to the replica file"""
+    db = SessionLocal()
+    try:
+        db.add(User(
+            name="Admin User",
+            email=ADMIN_EMAIL,
+            phone="9999999990",
+            password=get_password_hash(ADMIN_PASSWORD),
+            state="State",
+            city="City",
+            country="Country",
+            pincode="12345",
+            role=UserRole.ADMIN
+        ))
+        db.commit()
+    finally:
+        db.close()
+    shutil.copyfile(PRIMARY_PATH, REPLICA_PATH)
+
+def listed_emails(client, headers, email):
+    response = client.get(f"/api/users?search={email}", headers=headers)
+    return [user["email"] for user in response.json()["data"]]
+
+def test_reads_follow_cookie(client, headers):
+    """Test that reads go to the replica, and to the primary while the sticky cookie is set"""
+    print("\n[TEST] Testing Read Routing...")
+    user = new_user_data(int(time.time()) % 100000000)
+    response = client.post("/api/auth/register", json=user)
+    if response.status_code != 201:
+        print_test("Register On Primary", False, f"Status: {response.status_code}, {response.text}")
+        return None
+    sticky_until = response.cookies.get(PRIMARY_STICKY_COOKIE)
+    print_test("Write Sets Sticky Cookie", bool(sticky_until), f"{PRIMARY_STICKY_COOKIE}={sticky_until}")
+
+    emails = listed_emails(client, headers, user["email"])
+    print_test("Read After Write Uses Primary", user["email"] in emails, f"Found: {emails}")
+
+    client.cookies.clear()
+    emails = listed_emails(client, headers, user["email"])
+    print_test("Read Without Cookie Uses Replica", user["email"] not in emails, f"Found: {emails}")
+
+    client.cookies.set(PRIMARY_STICKY_COOKIE, str(int(time.time()) - 1))
+    emails = listed_emails(client, headers, user["email"])
+    print_test("Expired Cookie Uses Replica", user["email"] not in emails, f"Found: {emails}")
+    client.cookies.clear()
+    return user["email"]
+
+async def check_session_sticks_to_primary(primary_only_email):
+    async with AsyncReadSessionLocal() as db:
+        before_write = await db.scalar(select(User.id).where(User.email == primary_only_email))
+        db.add(User(**dict(new_user_data(int(time.time()) % 100000000 + 1), password="x")))
+        await db.flush()  # on the primary
+        after_write = await db.scalar(select(User.id).where(User.email == primary_only_email))
+        await db.rollback()
+    return before_write, after_write
+
+def test_session_sticks_to_primary(primary_only_email):
+    """Test that a read session reads the replica until it writes, then stays on the primary"""
+    print("\n[TEST] Testing Routing Session...")
+    before_write, after_write = asyncio.run(check_session_sticks_to_primary(primary_only_email))
+    print_test("Routing Session Reads Replica", before_write is None)
+    print_test("Routing Session Reads Primary After Write", after_write is not None)
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("User Management System - Read Replica Routing Test")
+    print("=" * 60)
+    print(f"\nPrimary: {PRIMARY_PATH}\nReplica: {REPLICA_PATH}")
+
+    create_admin_and_replica()
+    try:
+        with TestClient(app) as client:
+            response = client.post(
+                "/api/auth/login", json={"email_or_phone": ADMIN_EMAIL, "password": ADMIN_PASSWORD}
+            )
+            if response.status_code != 200:
+                print_test("Admin Login", False, f"Status: {response.status_code}")
+                return
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            client.cookies.clear()
+            primary_only_email = test_reads_follow_cookie(client, headers)
+        if primary_only_email:
+            test_session_sticks_to_primary(primary_only_email)
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    passed = sum(1 for _, status, _ in test_results if status)
+    total = len(test_results)
+    print(f"\n[PASS] Passed: {passed}/{total}")
+    print(f"[FAIL] Failed: {total - passed}/{total}")
+    if passed != total:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()